@@ -18,12 +18,13 @@ def ensure_model_loaded():
     Raises:
         HTTPException: If model is not loaded
     """
-    if not model_manager.is_loaded():
+    components = model_manager.components
+    if components is None:
         raise HTTPException(
             status_code=503,
             detail="Model not loaded. Please wait for initialization to complete."
         )
-    return model_manager.get_model(), model_manager.get_tokenizer(), model_manager.get_device()
+    return components
 
 
 def get_model_components():
@@ -8,8 +8,11 @@ import logging
 import time
 from fastapi import APIRouter, HTTPException
 
-from schemas.chat import ChatCompletionRequest, ChatCompletionResponse
-from services.generation_service import format_chat_messages
+from schemas.chat import ChatCompletionRequest, ChatCompletionResponse, ChatCompletionChoice, ChatCompletionUsage
+from core.config import settings
+from services.generation_service import format_chat_messages, render_chat_prompt, prepare_generation_params
+from services.batch_engine import batch_engine
+from services.semantic_cache import semantic_cache
 from api.dependencies import get_model_components, get_function_registry
 
 logger = logging.getLogger(__name__)
@@ -45,68 +48,65 @@ async def chat_completion(request: ChatCompletionRequest):
         top_p = request.top_p
         custom_system_prompt = request.system_prompt
         
-        # Validate messages
-        if not messages or not isinstance(messages, list):
+        # Message fields are validated by the request schema
+        if not messages:
             raise HTTPException(status_code=400, detail="Invalid messages format")
         
         # Format messages with system prompt and function calling instructions
         chat = format_chat_messages(messages, custom_system_prompt, function_registry)
         
-        # Validate message format
-        for msg in messages:
-            if "role" not in msg or "content" not in msg:
-                raise HTTPException(status_code=400, detail="Invalid message format")
-        
-        # Apply chat template
-        formatted_prompt = tokenizer.apply_chat_template(chat, tokenize=False, add_generation_prompt=True)
+        # Apply chat template and tokenize
+        formatted_prompt, input_ids, prefix_length = await render_chat_prompt(tokenizer, chat)
         
         # Start timing
-        start_time = time.time()
-        
-        # Tokenize the text
-        input_tokens = tokenizer(formatted_prompt, return_tensors="pt").to(device)
+        start_time = time.perf_counter()
         
-        # Generate output tokens
-        output = model.generate(
-            **input_tokens,
-            max_new_tokens=max_tokens,
+        generation_params = prepare_generation_params(
+            max_tokens=max_tokens,
             temperature=temperature,
-            top_p=top_p,
-            do_sample=temperature > 0.0
+            top_p=top_p
         )
         
-        # Decode output tokens into text
-        # Extract only the new tokens (exclude the input prompt)
-        input_length = input_tokens["input_ids"].shape[1]
-        generated_text = tokenizer.batch_decode(output[:, input_length:], skip_special_tokens=True)[0]
+        # Reuse the response of a near-duplicate prompt if one is cached
+        cache_query = await semantic_cache.embed(formatted_prompt)
+        cached = semantic_cache.get(cache_query, "chat", generation_params)
+        
+        if cached is not None:
+            generated_text, prompt_tokens, completion_tokens = cached
+        else:
+            # Generate through the shared batch engine
+            generated_texts, prompt_tokens, completion_tokens = await batch_engine.submit(
+                input_ids, generation_params, prefix_length
+            )
+            generated_text = generated_texts[0]
+            
+            semantic_cache.set(
+                cache_query, "chat", generation_params,
+                (generated_text, prompt_tokens, completion_tokens)
+            )
         
         # Calculate execution time
-        execution_time = time.time() - start_time
+        execution_time = time.perf_counter() - start_time
         
         # Format response in OpenAI-like structure
-        response = {
-            "id": f"chatcmpl-{int(time.time())}",
-            "object": "chat.completion",
-            "created": int(time.time()),
-            "model": "ibm-granite/granite-4.0-1b",
-            "choices": [
-                {
-                    "index": 0,
-                    "message": {
-                        "role": "assistant",
-                        "content": generated_text
-                    },
-                    "finish_reason": "stop"
-                }
+        created = int(time.time())
+        return ChatCompletionResponse(
+            id=f"chatcmpl-{created}",
+            created=created,
+            model=settings.MODEL_NAME,
+            choices=[
+                ChatCompletionChoice(
+                    index=0,
+                    message={"role": "assistant", "content": generated_text},
+                    finish_reason="stop"
+                )
             ],
-            "usage": {
-                "prompt_tokens": len(input_tokens["input_ids"][0]),
-                "completion_tokens": len(output[0]) - len(input_tokens["input_ids"][0]),
-                "total_tokens": len(output[0])
-            }
-        }
-        
-        return response
+            usage=ChatCompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens
+            )
+        )
     
     except Exception as e:
         logger.error(f"Error in chat completion: {str(e)}")
@@ -4,19 +4,59 @@ File upload endpoint for chat with documents.
 This module handles file uploads and document processing for chat.
 """
 
+import asyncio
 import logging
 import time
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 from fastapi import APIRouter, HTTPException, File, Form, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 from services.document_service import prepare_prompt_with_context, process_document_with_cache
+from services.generation_service import render_chat_prompt, prepare_generation_params
+from services.batch_engine import batch_engine
 from api.dependencies import get_model_components, get_file_processing_components
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1", tags=["files"])
 
+# Size of each read when copying an upload to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def _read_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    """Yield an upload's content one chunk at a time"""
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+async def _save_upload(file: UploadFile, file_manager) -> Tuple[str, str]:
+    """
+    Validate an upload and stream it to disk without exceeding the size limit.
+    
+    The declared size and extension are checked before any content is read.
+    The body is then copied from the spooled upload to the upload directory in
+    chunks with async file I/O, so it is never buffered whole in memory and an
+    oversized upload fails as soon as it crosses the limit.
+    
+    Args:
+        file: Uploaded file
+        file_manager: FileManager instance
+        
+    Returns:
+        Tuple of (saved file path, content hash)
+        
+    Raises:
+        HTTPException: If the file type is not allowed or the file is too large
+    """
+    is_valid, error_msg = file_manager.validate_file(file.filename, file.size or 0)
+    if not is_valid:
+        raise HTTPException(status_code=400, detail=error_msg)
+    
+    saved = await file_manager.save_file(_read_chunks(file), file.filename)
+    if saved is None:
+        raise HTTPException(status_code=413, detail="File too large")
+    
+    return saved
+
 
 @router.post("/chat/upload")
 async def chat_with_files(
@@ -40,7 +80,7 @@ async def chat_with_files(
         system_prompt: Optional custom system prompt
         
     Returns:
-        JSONResponse: Generated response with file processing information
+        ORJSONResponse: Generated response with file processing information
         
     Raises:
         HTTPException: For invalid requests or processing errors
@@ -49,36 +89,38 @@ async def chat_with_files(
     file_manager, docling_processor, cache_manager = get_file_processing_components()
     
     try:
-        start_time = time.time()
+        start_time = time.perf_counter()
         processed_files = []
         
         # Process files if provided
         if files and len(files) > 0:
             logger.info(f"Processing {len(files)} uploaded files")
             
+            # Validate and save every file before processing any of them
+            uploads = []
             for file in files:
-                # Read file content
-                content = await file.read()
-                
-                # Validate file
-                is_valid, error_msg = file_manager.validate_file(file.filename, len(content))
-                if not is_valid:
-                    raise HTTPException(status_code=400, detail=error_msg)
-                
-                # Save file
-                file_path = await file_manager.save_file(content, file.filename)
-                
-                # Process with Docling (with caching)
-                processed_content = await process_document_with_cache(
-                    file_path,
-                    cache_manager,
-                    docling_processor
-                )
-                
-                if processed_content.get("success"):
+                file_path, file_hash = await _save_upload(file, file_manager)
+                # The upload was hashed while saving; don't read it again for the cache key
+                cache_manager.add_known_hash(file_path, file_hash)
+                uploads.append((file.filename, file_path))
+            
+            # Process files concurrently; identical uploads (here or in other
+            # requests) share one conversion inside process_document_with_cache
+            results = await asyncio.gather(
+                *[
+                    process_document_with_cache(file_path, cache_manager, docling_processor)
+                    for _, file_path in uploads
+                ],
+                return_exceptions=True
+            )
+            
+            for (filename, _), processed_content in zip(uploads, results):
+                if isinstance(processed_content, Exception):
+                    logger.warning(f"Failed to process {filename}: {str(processed_content)}")
+                elif processed_content.get("success"):
                     processed_files.append(processed_content)
                 else:
-                    logger.warning(f"Failed to process {file.filename}: {processed_content.get('error')}")
+                    logger.warning(f"Failed to process {filename}: {processed_content.get('error')}")
         
         # Prepare enhanced prompt with document context
         if processed_files:
@@ -93,31 +135,18 @@ async def chat_with_files(
         if system_prompt and not processed_files:
             messages.insert(0, {"role": "system", "content": system_prompt})
         
-        # Format chat
-        chat = []
-        for msg in messages:
-            chat.append({"role": msg["role"], "content": msg["content"]})
-        
-        # Apply chat template
-        formatted_prompt = tokenizer.apply_chat_template(chat, tokenize=False, add_generation_prompt=True)
+        # Apply chat template and tokenize
+        _, input_ids, prefix_length = await render_chat_prompt(tokenizer, messages)
         
-        # Tokenize
-        input_tokens = tokenizer(formatted_prompt, return_tensors="pt").to(device)
-        
-        # Generate
-        output = model.generate(
-            **input_tokens,
-            max_new_tokens=max_tokens,
-            temperature=temperature,
-            top_p=top_p,
-            do_sample=temperature > 0.0
+        # Generate through the shared batch engine
+        generated_texts, _, _ = await batch_engine.submit(
+            input_ids,
+            prepare_generation_params(max_tokens=max_tokens, temperature=temperature, top_p=top_p),
+            prefix_length
         )
+        generated_text = generated_texts[0]
         
-        # Decode
-        input_length = input_tokens["input_ids"].shape[1]
-        generated_text = tokenizer.batch_decode(output[:, input_length:], skip_special_tokens=True)[0]
-        
-        execution_time = time.time() - start_time
+        execution_time = time.perf_counter() - start_time
         
         # Format response
         response = {
@@ -135,7 +164,7 @@ async def chat_with_files(
         
         logger.info(f"Chat with files completed in {execution_time:.2f}s, processed {len(processed_files)} files")
         
-        return JSONResponse(content=response)
+        return ORJSONResponse(content=response)
         
     except HTTPException:
         raise
@@ -4,25 +4,28 @@ Frontend serving endpoint.
 This module serves the chat interface HTML page.
 """
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
 router = APIRouter(tags=["frontend"])
 templates = Jinja2Templates(directory="templates")
 
+# The page has no per-request content, so render it once at import
+_rendered_page = templates.get_template("index.html").render().encode("utf-8")
+
 
 @router.get("/", response_class=HTMLResponse)
-async def chat_interface(request: Request):
+async def chat_interface():
     """
     Serve the main chat interface page.
     
-    Args:
-        request: FastAPI request object
-        
     Returns:
-        HTMLResponse: The rendered chat interface
+        HTMLResponse: The pre-rendered chat interface
     """
-    return templates.TemplateResponse("index.html", {"request": request})
+    return HTMLResponse(
+        content=_rendered_page,
+        headers={"Cache-Control": "public, max-age=60"}
+    )
 
 # Made with Bob
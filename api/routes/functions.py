@@ -6,10 +6,15 @@ This module handles function calling capabilities and function execution.
 
 import logging
 import time
+from functools import lru_cache
+import orjson
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 
-from schemas.functions import FunctionCallRequest, FunctionExecutionRequest
+from schemas.functions import FunctionCallRequest, FunctionCallResponse, FunctionCallChoice, FunctionExecutionRequest
+from core.config import settings
+from services.generation_service import render_chat_prompt, prepare_generation_params
+from services.batch_engine import batch_engine
 from api.dependencies import get_model_components, get_function_registry
 
 logger = logging.getLogger(__name__)
@@ -17,7 +22,17 @@ logger = logging.getLogger(__name__)
 router = APIRouter(tags=["functions"])
 
 
-@router.post("/v1/function_call")
+@lru_cache(maxsize=1)
+def _functions_payload(registry_version: int) -> bytes:
+    """Serialize the function listing once per registry version."""
+    function_registry = get_function_registry()
+    return orjson.dumps({
+        "functions": function_registry.get_all_functions(),
+        "tools": orjson.Fragment(function_registry.get_tools_schema_json())
+    })
+
+
+@router.post("/v1/function_call", response_model=FunctionCallResponse)
 async def function_call(request: FunctionCallRequest):
     """
     Endpoint for function calling capabilities.
@@ -42,59 +57,34 @@ async def function_call(request: FunctionCallRequest):
         max_tokens = request.max_tokens
         temperature = request.temperature
         
-        # Validate messages
-        if not messages or not isinstance(messages, list):
+        # Message fields are validated by the request schema
+        if not messages:
             raise HTTPException(status_code=400, detail="Invalid messages format")
         
-        # Format messages for our model
-        chat = []
-        for msg in messages:
-            if "role" not in msg or "content" not in msg:
-                raise HTTPException(status_code=400, detail="Invalid message format")
-            chat.append({"role": msg["role"], "content": msg["content"]})
+        # Apply chat template with tools and tokenize
+        _, input_ids, prefix_length = await render_chat_prompt(tokenizer, messages, tools)
         
-        # Apply chat template with tools
-        formatted_prompt = tokenizer.apply_chat_template(
-            chat, 
-            tokenize=False, 
-            add_generation_prompt=True,
-            tools=tools
+        # Generate through the shared batch engine
+        generated_texts, _, _ = await batch_engine.submit(
+            input_ids,
+            prepare_generation_params(max_tokens=max_tokens, temperature=temperature),
+            prefix_length
         )
-        
-        # Tokenize the text
-        input_tokens = tokenizer(formatted_prompt, return_tensors="pt").to(device)
-        
-        # Generate output tokens
-        output = model.generate(
-            **input_tokens,
-            max_new_tokens=max_tokens,
-            temperature=temperature,
-            do_sample=temperature > 0.0
-        )
-        
-        # Decode output tokens into text
-        # Extract only the new tokens (exclude the input prompt)
-        input_length = input_tokens["input_ids"].shape[1]
-        generated_text = tokenizer.batch_decode(output[:, input_length:], skip_special_tokens=True)[0]
+        generated_text = generated_texts[0]
         
         # Format response
-        response = {
-            "id": f"funcall-{int(time.time())}",
-            "object": "function.call",
-            "created": int(time.time()),
-            "model": "ibm-granite/granite-4.0-1b",
-            "choices": [
-                {
-                    "index": 0,
-                    "message": {
-                        "role": "assistant",
-                        "content": generated_text
-                    }
-                }
+        created = int(time.time())
+        return FunctionCallResponse(
+            id=f"funcall-{created}",
+            created=created,
+            model=settings.MODEL_NAME,
+            choices=[
+                FunctionCallChoice(
+                    index=0,
+                    message={"role": "assistant", "content": generated_text}
+                )
             ]
-        }
-        
-        return response
+        )
     
     except Exception as e:
         logger.error(f"Error in function call: {str(e)}")
@@ -107,14 +97,14 @@ async def get_available_functions():
     Get list of all available functions that can be called.
     
     Returns:
-        JSONResponse: Dictionary containing available functions and tools schema
+        Response: JSON containing available functions and tools schema
     """
     function_registry = get_function_registry()
     
-    return JSONResponse(content={
-        "functions": function_registry.get_all_functions(),
-        "tools": function_registry.get_tools_schema()
-    })
+    return Response(
+        content=_functions_payload(function_registry.version),
+        media_type="application/json"
+    )
 
 
 @router.post("/api/execute_function")
@@ -126,7 +116,7 @@ async def execute_function(request: FunctionExecutionRequest):
         request: Function execution request with function name and arguments
         
     Returns:
-        JSONResponse: Execution result or error
+        ORJSONResponse: Execution result or error
         
     Raises:
         HTTPException: For invalid requests or execution errors
@@ -146,12 +136,12 @@ async def execute_function(request: FunctionExecutionRequest):
         result = await function_registry.execute(function_name, arguments)
         
         if not result["success"]:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=400,
                 content={"success": False, "error": result["error"]}
             )
         
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "success": True,
             "function_name": function_name,
             "result": result["result"]
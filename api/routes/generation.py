@@ -9,12 +9,25 @@ import torch
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 from api.dependencies import get_model_components
 from schemas import GenerationRequest, GenerationResponse
-from services import prepare_generation_params, format_chat_prompt
+from services import (
+    prepare_generation_params,
+    format_chat_prompt,
+    render_chat_prompt,
+    batch_engine,
+    semantic_cache,
+    generation_cache,
+)
 from core.helpers import Timer
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["generation"])
 
+# Request fields echoed back in the response parameters
+_PARAM_FIELDS = {
+    "max_tokens", "temperature", "top_p", "top_k",
+    "repetition_penalty", "do_sample", "num_return_sequences"
+}
+
 
 @router.post("/generate", response_model=GenerationResponse)
 async def generate_text(request: GenerationRequest, background_tasks: BackgroundTasks):
@@ -41,17 +54,19 @@ async def generate_text(request: GenerationRequest, background_tasks: Background
     # Get model components
     model, tokenizer, device = get_model_components()
     
+    # Identical requests are answered straight from the exact-match cache
+    cached_response = generation_cache.get(request)
+    if cached_response is not None:
+        return cached_response
+    
     try:
         # Use the Timer context manager for accurate timing
         with Timer() as timer:
             # Format the prompt as a chat
             chat = format_chat_prompt(request.prompt)
             
-            # Apply chat template
-            formatted_prompt = tokenizer.apply_chat_template(chat, tokenize=False, add_generation_prompt=True)
-            
-            # Tokenize the text
-            input_tokens = tokenizer(formatted_prompt, return_tensors="pt").to(device)
+            # Apply chat template and tokenize
+            formatted_prompt, input_ids, prefix_length = await render_chat_prompt(tokenizer, chat)
             
             # Prepare generation parameters
             generation_params = prepare_generation_params(
@@ -64,27 +79,31 @@ async def generate_text(request: GenerationRequest, background_tasks: Background
                 num_return_sequences=request.num_return_sequences
             )
             
-            # Generate output tokens
-            output = model.generate(**input_tokens, **generation_params)
+            # Reuse the response of a near-duplicate prompt if one is cached
+            cache_query = await semantic_cache.embed(formatted_prompt)
+            generated_texts = semantic_cache.get(cache_query, "generate", generation_params)
             
-            # Decode output tokens into text
-            # Extract only the new tokens (exclude the input prompt)
-            input_length = input_tokens["input_ids"].shape[1]
-            generated_texts = tokenizer.batch_decode(output[:, input_length:], skip_special_tokens=True)
+            if generated_texts is None:
+                # Generate through the shared batch engine
+                generated_texts, _, _ = await batch_engine.submit(
+                    input_ids, generation_params, prefix_length
+                )
+                
+                semantic_cache.set(cache_query, "generate", generation_params, generated_texts)
         
         # Log completion
         logger.info(f"Text generation completed in {timer.elapsed:.2f} seconds")
         
         # Return the first generated text
-        return GenerationResponse(
+        response = GenerationResponse(
             generated_text=generated_texts[0],
             execution_time=timer.elapsed,
             prompt=request.prompt,
-            parameters={field: getattr(request, field) for field in [
-                "max_tokens", "temperature", "top_p", "top_k",
-                "repetition_penalty", "do_sample", "num_return_sequences"
-            ]}
+            parameters=request.model_dump(include=_PARAM_FIELDS)
         )
+        generation_cache.set(request, response)
+        
+        return response
     
     except torch.cuda.OutOfMemoryError as e:
         logger.error(f"CUDA out of memory error: {str(e)}")
@@ -5,7 +5,7 @@ This module provides a simple health check endpoint to verify the API is running
 """
 
 from fastapi import APIRouter, HTTPException
-from api.dependencies import ensure_model_loaded
+from core import model_manager
 from core.config import settings
 
 router = APIRouter(tags=["health"])
@@ -22,13 +22,11 @@ async def health_check():
     Raises:
         HTTPException: If model is not loaded
     """
-    try:
-        ensure_model_loaded()
-        return {
-            "status": "ok",
-            "model": settings.MODEL_NAME
-        }
-    except HTTPException:
+    if model_manager.components is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
+    return {
+        "status": "ok",
+        "model": settings.MODEL_NAME
+    }
 
 # Made with Bob
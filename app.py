@@ -7,6 +7,7 @@ Main FastAPI application entry point - Refactored Version
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from core import lifespan, settings
@@ -24,6 +25,7 @@ app = FastAPI(
     title=settings.API_TITLE,
     description=settings.API_DESCRIPTION,
     version=settings.API_VERSION,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -43,12 +45,21 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 app.include_router(router)
 
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
+    
+    # uvloop and httptools are faster than asyncio's default loop and h11,
+    # but uvloop is not available on Windows; fall back to uvicorn's defaults
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "auto"
+    http = "httptools" if importlib.util.find_spec("httptools") else "auto"
+    
     uvicorn.run(
         "app:app",
         host=settings.HOST,
         port=settings.PORT,
-        reload=settings.RELOAD
+        reload=settings.RELOAD,
+        loop=loop,
+        http=http
     )
 
 # Made with Bob
\ No newline at end of file
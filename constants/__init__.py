@@ -1,7 +1,8 @@
 """Constants module for the Tiny LLM application."""
 
 from .cities import CITY_COORDINATES
+from .weather import WEATHER_CONDITIONS
 
-__all__ = ["CITY_COORDINATES"]
+__all__ = ["CITY_COORDINATES", "WEATHER_CONDITIONS"]
 
 # Made with Bob
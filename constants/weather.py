@@ -0,0 +1,18 @@
+"""
+Weather condition names.
+
+This module maps Meteoblue pictocodes to human-readable weather conditions.
+"""
+
+from typing import Dict
+
+WEATHER_CONDITIONS: Dict[int, str] = {
+    1: "Clear", 2: "Partly Cloudy", 3: "Cloudy", 4: "Overcast",
+    5: "Fog", 6: "Light Rain", 7: "Rain", 8: "Heavy Rain",
+    9: "Thunderstorm", 12: "Light Snow", 13: "Snow", 14: "Heavy Snow",
+    20: "Drizzle", 21: "Light Showers", 22: "Showers", 23: "Heavy Showers",
+    27: "Light Snow Showers", 28: "Snow Showers", 31: "Thunderstorm with Rain",
+    33: "Thunderstorm with Snow"
+}
+
+# Made with Bob
@@ -1,14 +1,38 @@
 """Core module for the Tiny LLM application."""
 
+import sys
+from importlib import import_module
+
 from .config import settings, Settings
-from .model_manager import model_manager, ModelManager
-from .lifespan import (
-    lifespan,
-    get_function_registry,
-    get_file_manager,
-    get_docling_processor,
-    get_cache_manager,
-)
+
+# The model manager and lifespan import torch and transformers, so they are
+# only loaded on first access; importing core.config alone stays lightweight
+_LAZY_ATTRIBUTES = {
+    "model_manager": ".model_manager",
+    "ModelManager": ".model_manager",
+    "lifespan": ".lifespan",
+    "get_function_registry": ".lifespan",
+    "get_file_manager": ".lifespan",
+    "get_docling_processor": ".lifespan",
+    "get_cache_manager": ".lifespan",
+}
+
+
+def __getattr__(name: str):
+    """Import lazily exported attributes on first access."""
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import_module(_LAZY_ATTRIBUTES[name], __name__)
+    
+    # Loading a submodule binds it on this package under its own name (e.g.
+    # core.model_manager), shadowing the same-named export, so rebind every
+    # export whose submodule is loaded now
+    for attribute, module_name in _LAZY_ATTRIBUTES.items():
+        module = sys.modules.get(__name__ + module_name)
+        if module is not None:
+            globals()[attribute] = getattr(module, attribute)
+    return globals()[name]
+
 
 __all__ = [
     # Config
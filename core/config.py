@@ -6,7 +6,7 @@ and application constants.
 """
 
 import os
-from typing import List
+from typing import FrozenSet, List
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,7 +18,13 @@ class Settings:
     
     # Model Configuration
     MODEL_PATH: str = "ibm-granite/granite-4.0-1b"
-    MODEL_NAME: str = "ibm-granite/granite-4.0-1b"
+    MODEL_NAME: str = MODEL_PATH
+    MODEL_COMPILE: bool = os.getenv("MODEL_COMPILE", "true").lower() == "true"
+    MODEL_QUANTIZATION: str = os.getenv("MODEL_QUANTIZATION", "off").lower()  # off, int8 or nf4
+    MODEL_DTYPE: str = os.getenv("MODEL_DTYPE", "auto").lower()  # auto, bfloat16, float16 or float32
+    # Optional small model sharing the tokenizer, used for speculative decoding
+    DRAFT_MODEL_PATH: str = os.getenv("DRAFT_MODEL_PATH", "")
+    NUM_ASSISTANT_TOKENS: int = int(os.getenv("NUM_ASSISTANT_TOKENS", "5"))
     
     # Server Configuration
     HOST: str = "0.0.0.0"
@@ -35,10 +41,13 @@ class Settings:
     CACHE_DIR: str = os.getenv("CACHE_DIR", "./cache")
     MAX_FILE_SIZE_MB: int = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
     CACHE_TTL_HOURS: int = int(os.getenv("CACHE_TTL_HOURS", "24"))
-    ALLOWED_EXTENSIONS: List[str] = os.getenv(
-        "ALLOWED_EXTENSIONS",
-        "pdf,docx,pptx,xlsx,png,jpg,jpeg,gif,txt,md"
-    ).split(",")
+    DOCLING_PROCESS_WORKERS: int = int(os.getenv("DOCLING_PROCESS_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+    DOCUMENT_MAX_CHARS: int = int(os.getenv("DOCUMENT_MAX_CHARS", "0"))  # per-document prompt context, 0 = no limit
+    ALLOWED_EXTENSIONS: FrozenSet[str] = frozenset(
+        ext.strip().lower()
+        for ext in os.getenv("ALLOWED_EXTENSIONS", "pdf,docx,pptx,xlsx,png,jpg,jpeg,gif,txt,md").split(",")
+        if ext.strip()
+    )
     
     # External API Configuration
     METEOBLUE_API_KEY: str = os.getenv("METEOBLUE_API_KEY", "demo")
@@ -49,6 +58,29 @@ class Settings:
     DEFAULT_TOP_P: float = 1.0
     DEFAULT_DO_SAMPLE: bool = True
     
+    # Batching Configuration
+    BATCH_MAX_SIZE: int = int(os.getenv("BATCH_MAX_SIZE", "16"))
+    BATCH_MAX_WAIT_MS: float = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+    
+    # Conversation Window (max prompt tokens; oldest turns are dropped beyond it, 0 disables)
+    CONTEXT_WINDOW_TOKENS: int = int(os.getenv("CONTEXT_WINDOW_TOKENS", "0"))
+    
+    # Prefix KV Cache Configuration (reuses system prompt and earlier turn prefill across requests)
+    PREFIX_CACHE_ENABLED: bool = os.getenv("PREFIX_CACHE_ENABLED", "true").lower() == "true"
+    PREFIX_CACHE_MAX_ENTRIES: int = int(os.getenv("PREFIX_CACHE_MAX_ENTRIES", "8"))
+    PREFIX_CACHE_MAX_TOKENS: int = int(os.getenv("PREFIX_CACHE_MAX_TOKENS", "32768"))
+    
+    # Semantic Cache Configuration
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_MODEL: str = os.getenv("SEMANTIC_CACHE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1024"))
+    SEMANTIC_CACHE_TTL_SECONDS: int = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "300"))
+    
+    # Generation Cache Configuration (exact-match cache for /generate)
+    GENERATION_CACHE_ENABLED: bool = os.getenv("GENERATION_CACHE_ENABLED", "false").lower() == "true"
+    GENERATION_CACHE_MAX_ENTRIES: int = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "1024"))
+    
     # Streaming Configuration
     GENERATION_THREAD_TIMEOUT: float = 1.0
     
@@ -15,16 +15,18 @@ class Timer:
         with Timer() as t:
             # code to time
         elapsed_time = t.elapsed
+    
+    Uses the monotonic perf_counter clock.
     """
     def __init__(self):
         self.elapsed = 0
         self._start_time = 0
         
     def __enter__(self):
-        self._start_time = time.time()
+        self._start_time = time.perf_counter()
         return self
         
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.elapsed = time.time() - self._start_time
+        self.elapsed = time.perf_counter() - self._start_time
 
 # Made with Bob
@@ -4,13 +4,25 @@ Application lifespan management.
 This module handles startup and shutdown events for the FastAPI application.
 """
 
+import asyncio
 import logging
+import multiprocessing
 import os
-from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncContextManager, Callable, Tuple
 from fastapi import FastAPI
 from .model_manager import model_manager
 from .config import settings
-from services import FunctionRegistry, get_weather, search_web
+from services import (
+    FunctionRegistry,
+    get_weather,
+    search_web,
+    batch_engine,
+    semantic_cache,
+    get_http_client,
+    close_http_client,
+)
 from utils import FileManager, DoclingProcessor, CacheManager, CleanupScheduler
 
 logger = logging.getLogger(__name__)
@@ -21,99 +33,186 @@ file_manager = None
 docling_processor = None
 cache_manager = None
 cleanup_scheduler = None
+docling_pool = None
 
 
 @asynccontextmanager
-async def lifespan(app: FastAPI):
+async def model_lifespan(app: FastAPI):
     """
-    Lifespan context manager for startup and shutdown events.
+    Load the model and run the generation services around it.
     
     Args:
         app: FastAPI application instance
     """
-    global file_manager, docling_processor, cache_manager, cleanup_scheduler
+    # Wait for the load that lifespan started in the background, or load on a
+    # worker thread so the event loop keeps running while weights load
+    model_loading = getattr(app.state, "model_loading", None)
+    if model_loading is not None:
+        await model_loading
+    else:
+        await asyncio.to_thread(model_manager.load_model)
     
-    # Startup
-    try:
-        # Load model and tokenizer
-        model_manager.load_model()
-        
-        # Initialize file processing components
-        logger.info("Initializing file processing system...")
-        
-        file_manager = FileManager(
-            upload_dir=settings.UPLOAD_DIR,
-            max_size_mb=settings.MAX_FILE_SIZE_MB,
-            allowed_extensions=settings.ALLOWED_EXTENSIONS
-        )
-        
-        docling_processor = DoclingProcessor()
-        
-        cache_manager = CacheManager(
-            cache_dir=settings.CACHE_DIR,
-            ttl_hours=settings.CACHE_TTL_HOURS
-        )
-        
-        # Start cleanup scheduler
-        cleanup_scheduler = CleanupScheduler(file_manager, cache_manager)
-        cleanup_scheduler.start()
-        
-        logger.info("File processing system initialized")
-        
-        # Register functions
-        logger.info("Registering functions...")
-        
-        # Register weather function
-        function_registry.register(
-            name="get_weather",
-            description="Get current weather information for a specific location",
-            parameters={
-                "location": {
-                    "type": "string",
-                    "description": "The city or location name",
-                    "required": True
-                },
-                "units": {
-                    "type": "string",
-                    "description": "Temperature units (celsius or fahrenheit)",
-                    "enum": ["celsius", "fahrenheit"],
-                    "required": False
-                }
+    # Start batching generation requests across endpoints
+    batch_engine.start(
+        model_manager.model,
+        model_manager.tokenizer,
+        model_manager.device,
+        draft_model=model_manager.draft_model
+    )
+    
+    # Load the semantic response cache if enabled
+    if settings.SEMANTIC_CACHE_ENABLED:
+        semantic_cache.load()
+    
+    yield
+    
+    await batch_engine.shutdown()
+
+
+@asynccontextmanager
+async def files_lifespan(app: FastAPI):
+    """
+    Set up file storage, document processing and their periodic cleanup.
+    
+    Args:
+        app: FastAPI application instance
+    """
+    global file_manager, docling_processor, cache_manager, cleanup_scheduler, docling_pool
+    
+    # Initialize file processing components
+    logger.info("Initializing file processing system...")
+    
+    file_manager = FileManager(
+        upload_dir=settings.UPLOAD_DIR,
+        max_size_mb=settings.MAX_FILE_SIZE_MB,
+        allowed_extensions=settings.ALLOWED_EXTENSIONS
+    )
+    
+    # Docling parsing is CPU-bound, so run it in worker processes. Spawn keeps
+    # workers from inheriting the already-initialized CUDA context.
+    docling_pool = ProcessPoolExecutor(
+        max_workers=settings.DOCLING_PROCESS_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+    docling_processor = DoclingProcessor(process_pool=docling_pool)
+    
+    cache_manager = CacheManager(
+        cache_dir=settings.CACHE_DIR,
+        ttl_hours=settings.CACHE_TTL_HOURS
+    )
+    
+    # Start cleanup scheduler
+    cleanup_scheduler = CleanupScheduler(file_manager, cache_manager)
+    cleanup_scheduler.start()
+    
+    logger.info("File processing system initialized")
+    
+    yield
+    
+    await cleanup_scheduler.shutdown()
+    docling_pool.shutdown(wait=False, cancel_futures=True)
+
+
+@asynccontextmanager
+async def functions_lifespan(app: FastAPI):
+    """
+    Register the callable functions and open the HTTP client they share.
+    
+    Args:
+        app: FastAPI application instance
+    """
+    # Open the pooled HTTP client shared by the external API functions
+    get_http_client()
+    
+    # Register functions
+    logger.info("Registering functions...")
+    
+    # Register weather function
+    function_registry.register(
+        name="get_weather",
+        description="Get current weather information for a specific location",
+        parameters={
+            "location": {
+                "type": "string",
+                "description": "The city or location name",
+                "required": True
             },
-            handler=get_weather
-        )
-        
-        # Register web search function
-        function_registry.register(
-            name="search_web",
-            description="Search the web for information using DuckDuckGo. Returns abstracts, related topics, and sources. Use this when you need current information, facts, or details about any topic.",
-            parameters={
-                "query": {
-                    "type": "string",
-                    "description": "The search query or question",
-                    "required": True
-                },
-                "max_results": {
-                    "type": "integer",
-                    "description": "Maximum number of related topics to return (default: 5)",
-                    "required": False
-                }
+            "units": {
+                "type": "string",
+                "description": "Temperature units (celsius or fahrenheit)",
+                "enum": ["celsius", "fahrenheit"],
+                "required": False
+            }
+        },
+        handler=get_weather
+    )
+    
+    # Register web search function
+    function_registry.register(
+        name="search_web",
+        description="Search the web for information using DuckDuckGo. Returns abstracts, related topics, and sources. Use this when you need current information, facts, or details about any topic.",
+        parameters={
+            "query": {
+                "type": "string",
+                "description": "The search query or question",
+                "required": True
             },
-            handler=search_web
-        )
-        
-        logger.info(f"Registered {len(function_registry.functions)} functions")
-        
-    except Exception as e:
-        logger.error(f"Error during startup: {str(e)}")
-        raise e
+            "max_results": {
+                "type": "integer",
+                "description": "Maximum number of related topics to return (default: 5)",
+                "required": False
+            }
+        },
+        handler=search_web
+    )
+    
+    logger.info(f"Registered {len(function_registry.functions)} functions")
     
     yield
     
-    # Shutdown
-    logger.info("Shutting down application...")
-    if cleanup_scheduler:
-        cleanup_scheduler.shutdown()
+    await close_http_client()
+
+
+# Subsystem lifespans, entered in order at startup and exited in reverse at
+# shutdown; additional sub-apps add their own lifespan here. The model comes
+# last so the other subsystems start while its weights are still loading.
+SUBSYSTEM_LIFESPANS: Tuple[Callable[[FastAPI], AsyncContextManager], ...] = (
+    files_lifespan,
+    functions_lifespan,
+    model_lifespan,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Lifespan context manager for startup and shutdown events.
+    
+    Composes the subsystem lifespans, so a subsystem that fails to start
+    still has the ones started before it shut down cleanly. Loading the model
+    is the slow part of startup, so it begins on a worker thread straight away
+    and overlaps with the other subsystems starting.
+    
+    Args:
+        app: FastAPI application instance
+    """
+    app.state.model_loading = asyncio.create_task(asyncio.to_thread(model_manager.load_model))
+    
+    async with AsyncExitStack() as stack:
+        # Startup
+        try:
+            for subsystem_lifespan in SUBSYSTEM_LIFESPANS:
+                await stack.enter_async_context(subsystem_lifespan(app))
+        except Exception as e:
+            logger.error(f"Error during startup: {str(e)}")
+            # Let a load still in flight finish before the error propagates
+            await asyncio.gather(app.state.model_loading, return_exceptions=True)
+            raise e
+        
+        yield
+        
+        # Shutdown
+        logger.info("Shutting down application...")
 
 
 def get_function_registry() -> FunctionRegistry:
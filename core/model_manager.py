@@ -4,15 +4,20 @@ Model management module.
 This module handles loading and managing the language model and tokenizer.
 """
 
+import importlib.util
 import logging
+import os
 import time
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
 from typing import Optional, Tuple
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
+# Prompt lengths generated once at startup to warm up the model
+WARMUP_PROMPT_LENGTHS = (8, 512)
+
 
 class ModelManager:
     """Manages the language model and tokenizer lifecycle."""
@@ -21,39 +26,236 @@ class ModelManager:
         self.model: Optional[AutoModelForCausalLM] = None
         self.tokenizer: Optional[AutoTokenizer] = None
         self.device: str = "cpu"
+        self.dtype: torch.dtype = torch.float32
+        self.draft_model: Optional[AutoModelForCausalLM] = None
+        # (model, tokenizer, device), set once loading succeeds
+        self.components: Optional[Tuple[AutoModelForCausalLM, AutoTokenizer, str]] = None
         
     def load_model(self) -> Tuple[AutoModelForCausalLM, AutoTokenizer, str]:
         """
         Load the model and tokenizer.
         
+        A model that is already loaded is returned as is, so re-entering the
+        application lifespan in the same process does not reload the weights.
+        
         Returns:
             Tuple of (model, tokenizer, device)
         """
+        if self.components is not None:
+            logger.info("Model already loaded, reusing it")
+            return self.components
+        
         logger.info("Loading model and tokenizer...")
-        start_time = time.time()
+        start_time = time.perf_counter()
+        self.components = None
         
         try:
-            # Set device
+            # Set device and weight precision (half precision on GPU, bf16 on CPUs with native support)
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
-            logger.info(f"Using device: {self.device}")
+            if self.device == "cuda":
+                self.dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+                # Allow TF32 matmuls and let cuDNN pick the fastest kernels
+                torch.backends.cuda.matmul.allow_tf32 = True
+                torch.backends.cudnn.benchmark = True
+            else:
+                self.dtype = self._get_cpu_dtype()
+                self._configure_cpu_threads()
+            if settings.MODEL_DTYPE != "auto":
+                self.dtype = self._get_configured_dtype()
+            logger.info(f"Using device: {self.device} ({self.dtype})")
             
             # Load model and tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(settings.MODEL_PATH)
+            quantization_config = self._get_quantization_config()
+            # The Rust-backed fast tokenizer releases the GIL while encoding
+            self.tokenizer = AutoTokenizer.from_pretrained(settings.MODEL_PATH, use_fast=True)
             self.model = AutoModelForCausalLM.from_pretrained(
                 settings.MODEL_PATH,
-                device_map=self.device
+                device_map=self.device,
+                torch_dtype=self.dtype,
+                quantization_config=quantization_config,
+                low_cpu_mem_usage=True,
+                attn_implementation=self._get_attn_implementation()
             )
             self.model.eval()
             
-            elapsed = time.time() - start_time
+            # CPU has no bitsandbytes kernels; quantize Linear layers dynamically instead
+            if self.device == "cpu" and settings.MODEL_QUANTIZATION in ("int8", "nf4"):
+                logger.info("Applying dynamic int8 quantization to Linear layers")
+                self.model = torch.quantization.quantize_dynamic(
+                    self.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            
+            # bitsandbytes layers do not compile cleanly, so quantized models stay eager
+            if settings.MODEL_COMPILE and self.device == "cuda" and quantization_config is None:
+                self._compile_model()
+            
+            if settings.DRAFT_MODEL_PATH:
+                # Assisted generation cannot run on a static cache, so the draft would never be used
+                if self.model.generation_config.cache_implementation is not None:
+                    logger.warning(
+                        "DRAFT_MODEL_PATH ignored: speculative decoding does not work with the "
+                        "static KV cache used by MODEL_COMPILE; set MODEL_COMPILE=false to use it"
+                    )
+                else:
+                    self._load_draft_model()
+            
+            self._warm_up()
+            
+            self.components = (self.model, self.tokenizer, self.device)
+            
+            elapsed = time.perf_counter() - start_time
             logger.info(f"Model loaded successfully in {elapsed:.2f} seconds")
             
-            return self.model, self.tokenizer, self.device
+            return self.components
             
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise e
     
+    def _get_attn_implementation(self) -> str:
+        """
+        Pick the fused attention kernel.
+        
+        FlashAttention-2 is used on CUDA when the flash_attn package is installed
+        and the weights are half precision; otherwise PyTorch's SDPA kernel.
+        """
+        if (
+            self.device == "cuda"
+            and self.dtype in (torch.float16, torch.bfloat16)
+            and importlib.util.find_spec("flash_attn") is not None
+        ):
+            return "flash_attention_2"
+        return "sdpa"
+    
+    def _get_configured_dtype(self) -> torch.dtype:
+        """
+        Resolve the MODEL_DTYPE override.
+        
+        bfloat16 falls back to float16 on GPUs without bf16 support.
+        
+        Raises:
+            ValueError: If MODEL_DTYPE is not a supported precision
+        """
+        dtypes = {"bfloat16": torch.bfloat16, "float16": torch.float16, "float32": torch.float32}
+        if settings.MODEL_DTYPE not in dtypes:
+            raise ValueError(f"Unsupported MODEL_DTYPE: {settings.MODEL_DTYPE}")
+        
+        dtype = dtypes[settings.MODEL_DTYPE]
+        if dtype == torch.bfloat16 and self.device == "cuda" and not torch.cuda.is_bf16_supported():
+            logger.warning("MODEL_DTYPE=bfloat16 is not supported on this GPU, using float16")
+            return torch.float16
+        return dtype
+    
+    def _get_cpu_dtype(self) -> torch.dtype:
+        """
+        Pick the CPU weight precision.
+        
+        Decoding on CPU is memory-bound, so bf16 halves the bytes read per token
+        on processors with native bf16 instructions. Dynamic int8 quantization
+        needs fp32 Linear layers, so it keeps the model in fp32.
+        """
+        if settings.MODEL_QUANTIZATION in ("int8", "nf4"):
+            return torch.float32
+        # Private torch helper; treat a version without it as lacking bf16 support
+        bf16_supported = getattr(torch.cpu, "_is_avx512_bf16_supported", lambda: False)
+        if bf16_supported():
+            return torch.bfloat16
+        return torch.float32
+    
+    def _configure_cpu_threads(self):
+        """Give intra-op parallelism every core and keep a single inter-op thread."""
+        torch.set_num_threads(os.cpu_count() or 1)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Can only be set once, before any inter-op work (e.g. on model reload)
+            pass
+    
+    def _load_draft_model(self):
+        """
+        Load the draft model used for speculative (assisted) decoding.
+        
+        The draft proposes several tokens per step that the main model verifies
+        in one forward pass. Failures are logged and generation falls back to
+        plain decoding.
+        """
+        logger.info(f"Loading draft model: {settings.DRAFT_MODEL_PATH}")
+        try:
+            self.draft_model = AutoModelForCausalLM.from_pretrained(
+                settings.DRAFT_MODEL_PATH,
+                device_map=self.device,
+                torch_dtype=self.dtype
+            )
+            self.draft_model.eval()
+        except Exception as e:
+            logger.warning(f"Draft model unavailable, speculative decoding disabled: {str(e)}")
+            self.draft_model = None
+    
+    def _get_quantization_config(self) -> Optional[BitsAndBytesConfig]:
+        """
+        Build the bitsandbytes config for the MODEL_QUANTIZATION setting.
+        
+        Returns:
+            Quantization config for CUDA loading, or None to load unquantized
+        """
+        mode = settings.MODEL_QUANTIZATION
+        if mode == "off" or self.device != "cuda":
+            return None
+        
+        if importlib.util.find_spec("bitsandbytes") is None:
+            logger.warning(f"MODEL_QUANTIZATION={mode} ignored, bitsandbytes is not installed")
+            return None
+        
+        logger.info(f"Quantizing model weights to {mode}")
+        if mode == "nf4":
+            return BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=self.dtype,
+                bnb_4bit_use_double_quant=True
+            )
+        return BitsAndBytesConfig(load_in_8bit=True)
+    
+    def _compile_model(self):
+        """
+        Compile the forward pass.
+        
+        A static KV cache keeps tensor shapes fixed between decode steps so the
+        compiled graph can be reused across steps.
+        """
+        logger.info("Compiling model forward pass...")
+        self.model.generation_config.cache_implementation = "static"
+        self.model.forward = torch.compile(self.model.forward, mode="reduce-overhead", fullgraph=False)
+    
+    def _warm_up(self):
+        """
+        Run short generations so the first request does not pay one-off costs.
+        
+        Kernel selection, allocator growth and (when compiled) graph capture all
+        happen on the first calls; a short and a long prompt are generated so
+        both prompt shapes are prepared before traffic arrives. The chat
+        template is rendered once as well, since the tokenizer compiles it on
+        first use.
+        """
+        self.tokenizer.apply_chat_template(
+            [{"role": "user", "content": "warmup"}], tokenize=True, add_generation_prompt=True
+        )
+        
+        for prompt_length in WARMUP_PROMPT_LENGTHS:
+            start_time = time.perf_counter()
+            with torch.inference_mode():
+                self.model.generate(
+                    input_ids=torch.zeros((1, prompt_length), dtype=torch.long, device=self.device),
+                    attention_mask=torch.ones((1, prompt_length), dtype=torch.long, device=self.device),
+                    max_new_tokens=8,
+                    do_sample=False
+                )
+            if self.device == "cuda":
+                # Wait for queued kernels so the timing covers them
+                torch.cuda.synchronize()
+            elapsed = time.perf_counter() - start_time
+            logger.info(f"Warmup generation ({prompt_length} prompt tokens) took {elapsed:.2f} seconds")
+    
     def is_loaded(self) -> bool:
         """Check if model and tokenizer are loaded."""
         return self.model is not None and self.tokenizer is not None
@@ -19,7 +19,7 @@ class ChatMessage(BaseModel):
 class ChatCompletionRequest(BaseModel):
     """Request model for chat completion."""
     
-    messages: List[Dict[str, Any]]
+    messages: List[ChatMessage]
     max_tokens: int = 100
     temperature: float = 1.0
     top_p: float = 1.0
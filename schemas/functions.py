@@ -7,6 +7,8 @@ This module contains request and response models for function calling APIs.
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 
+from .chat import ChatMessage
+
 
 class FunctionDefinition(BaseModel):
     """Definition of a callable function."""
@@ -19,7 +21,7 @@ class FunctionDefinition(BaseModel):
 class FunctionCallRequest(BaseModel):
     """Request model for function calling."""
     
-    messages: List[Dict[str, Any]]
+    messages: List[ChatMessage]
     tools: Optional[List[Dict[str, Any]]] = None
     max_tokens: int = 100
     temperature: float = 1.0
@@ -7,6 +7,8 @@ This module contains request and response models for the text generation API.
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 
+from core.config import settings
+
 
 class GenerationRequest(BaseModel):
     """Request model for text generation."""
@@ -38,7 +40,7 @@ class GenerationResponse(BaseModel):
     
     generated_text: str
     execution_time: float
-    model_name: str = "ibm-granite/granite-4.0-1b"
+    model_name: str = settings.MODEL_NAME
     prompt: str
     parameters: Dict[str, Any]
 
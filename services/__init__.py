@@ -1,15 +1,24 @@
 """Services module for the Tiny LLM application."""
 
 from .function_service import FunctionRegistry
+from .http_client import get_http_client, close_http_client, fetch
 from .weather_service import get_weather, geocode_location
 from .search_service import search_web
+from .batch_engine import BatchEngine, batch_engine
+from .prefix_cache import PrefixKVCache
+from .semantic_cache import SemanticCache, semantic_cache
+from .generation_cache import GenerationCache, generation_cache
 from .document_service import (
     format_document_context,
+    write_document_context,
     prepare_prompt_with_context,
     process_document_with_cache,
 )
 from .generation_service import (
     create_token_generator,
+    run_in_generation_executor,
+    render_chat_prompt,
+    RenderedPrompt,
     prepare_generation_params,
     format_chat_prompt,
     DISCONNECTION_EXCEPTIONS,
@@ -19,17 +28,36 @@ from .generation_service import (
 __all__ = [
     # Function service
     "FunctionRegistry",
+    # Shared HTTP client
+    "get_http_client",
+    "close_http_client",
+    "fetch",
     # Weather service
     "get_weather",
     "geocode_location",
     # Search service
     "search_web",
+    # Batch engine
+    "BatchEngine",
+    "batch_engine",
+    # Prefix KV cache
+    "PrefixKVCache",
+    # Semantic cache
+    "SemanticCache",
+    "semantic_cache",
+    # Generation cache
+    "GenerationCache",
+    "generation_cache",
     # Document service
     "format_document_context",
+    "write_document_context",
     "prepare_prompt_with_context",
     "process_document_with_cache",
     # Generation service
     "create_token_generator",
+    "run_in_generation_executor",
+    "render_chat_prompt",
+    "RenderedPrompt",
     "prepare_generation_params",
     "format_chat_prompt",
     "DISCONNECTION_EXCEPTIONS",
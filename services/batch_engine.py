@@ -0,0 +1,492 @@
+"""
+Batched generation engine.
+
+This module collects generation requests from all endpoints and runs
+concurrent requests through the model as a single batched generate call,
+including streamed requests whose text is fanned out per row.
+"""
+
+import asyncio
+import bisect
+import logging
+from contextlib import nullcontext
+from typing import Dict, Any, AsyncIterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import torch
+from transformers import DynamicCache, StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+
+from core.config import settings
+from .generation_service import run_in_generation_executor, move_to_device, generate_tokens
+from .prefix_cache import PrefixKVCache
+
+logger = logging.getLogger(__name__)
+
+# (generated texts, prompt token count, completion token count)
+BatchResult = Tuple[List[str], int, int]
+
+# Prompt length bin edges; prompts only share a batch with similar lengths
+LENGTH_BINS = (128, 512, 2048)
+
+# Padded batch length is rounded up to a multiple of this (tensor-core friendly)
+PAD_MULTIPLE = 8
+
+# Decode steps between checks for cancelled requests
+CANCEL_POLL_INTERVAL = 4
+
+
+class BatchItem(NamedTuple):
+    """A queued generation request."""
+    input_ids: List[int]
+    generation_params: Dict[str, Any]
+    future: asyncio.Future
+    # Receives text deltas for streamed requests, None otherwise
+    token_queue: Optional[asyncio.Queue]
+    # Length of the leading ids (system prompt or earlier turns) whose KV cache can be reused
+    prefix_length: int
+
+
+def _params_key(generation_params: Dict[str, Any]) -> tuple:
+    """Build a hashable key so only requests with identical sampling settings share a batch."""
+    return tuple(sorted(generation_params.items()))
+
+
+def _length_bin(length: int) -> int:
+    """Return the index of the length bin a prompt falls into."""
+    return bisect.bisect_right(LENGTH_BINS, length)
+
+
+class BatchTextIteratorStreamer(BaseStreamer):
+    """
+    Streamer that decodes every row of a batched generate call separately.
+
+    Text for each streamed row is pushed onto that request's asyncio queue
+    from the generation thread; rows without a queue are skipped. Like
+    TextStreamer, text is only released up to the last space or newline so
+    words spanning several tokens are not emitted half-decoded.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        token_queues: List[Optional[asyncio.Queue]],
+        loop: asyncio.AbstractEventLoop,
+        **decode_kwargs
+    ):
+        self.tokenizer = tokenizer
+        self.token_queues = token_queues
+        self.loop = loop
+        self.decode_kwargs = decode_kwargs
+        self.token_cache: List[List[int]] = [[] for _ in token_queues]
+        self.print_len = [0] * len(token_queues)
+        self.next_tokens_are_prompt = True
+
+    def put(self, value: torch.Tensor):
+        """Receive the next token of every row and forward printable text."""
+        # The first call carries the prompts, which are never streamed
+        if self.next_tokens_are_prompt:
+            self.next_tokens_are_prompt = False
+            return
+
+        for row, tokens in enumerate(value.reshape(len(self.token_queues), -1).tolist()):
+            if self.token_queues[row] is None:
+                continue
+
+            self.token_cache[row].extend(tokens)
+            text = self.tokenizer.decode(self.token_cache[row], **self.decode_kwargs)
+
+            if text.endswith("\n"):
+                printable = text[self.print_len[row]:]
+                self.token_cache[row] = []
+                self.print_len[row] = 0
+            else:
+                printable = text[self.print_len[row]:text.rfind(" ") + 1]
+                self.print_len[row] += len(printable)
+
+            if printable:
+                self._push(row, printable)
+
+    def end(self):
+        """Flush remaining text and signal the end of every stream."""
+        for row, token_queue in enumerate(self.token_queues):
+            if token_queue is None:
+                continue
+
+            if self.token_cache[row]:
+                text = self.tokenizer.decode(self.token_cache[row], **self.decode_kwargs)
+                if text[self.print_len[row]:]:
+                    self._push(row, text[self.print_len[row]:])
+            self._push(row, None)
+
+    def _push(self, row: int, text: Optional[str]):
+        """Hand a text delta, or None for end of stream, to the event loop."""
+        self.loop.call_soon_threadsafe(self.token_queues[row].put_nowait, text)
+
+
+class StopCancelledRows(StoppingCriteria):
+    """
+    Stopping criterion that finishes the rows of requests whose callers have gone away.
+
+    Cancellation is only checked every CANCEL_POLL_INTERVAL steps, and a
+    device-resident all-false result is reused while nothing is cancelled, so
+    ordinary decode steps do not copy a fresh mask to the device.
+    """
+
+    def __init__(self, futures: List[asyncio.Future], sequences: int):
+        self.futures = futures
+        self.sequences = sequences
+        self.steps = 0
+        self._not_done: Optional[torch.BoolTensor] = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        rows = input_ids.shape[0]
+        if self._not_done is None or self._not_done.shape[0] != rows:
+            self._not_done = torch.zeros(rows, dtype=torch.bool, device=input_ids.device)
+
+        self.steps += 1
+        if self.steps % CANCEL_POLL_INTERVAL or not any(future.cancelled() for future in self.futures):
+            return self._not_done
+
+        cancelled = [self.futures[row // self.sequences].cancelled() for row in range(rows)]
+        return torch.tensor(cancelled, dtype=torch.bool, device=input_ids.device)
+
+
+class BatchEngine:
+    """
+    Queue in front of model.generate that groups concurrent requests.
+
+    A background task waits until either max_batch_size requests are queued
+    or max_wait_ms has elapsed since the first one arrived, then left-pads the
+    prompts into one tensor and generates them together. Streamed requests
+    share batches with regular ones and receive their text through a queue.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = settings.BATCH_MAX_SIZE,
+        max_wait_ms: float = settings.BATCH_MAX_WAIT_MS
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.prefix_cache = PrefixKVCache()
+        self.model = None
+        self.draft_model = None
+        self.tokenizer = None
+        self.device: str = "cpu"
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stream = None
+        # Flat host buffers the padded input ids and attention mask are built in
+        self._staging: Optional[Tuple[torch.Tensor, torch.Tensor]] = None
+
+    def start(self, model, tokenizer, device: str, draft_model=None):
+        """Start the background batching task."""
+        self.model = model
+        self.draft_model = draft_model
+        self.tokenizer = tokenizer
+        self.device = device
+        # Dedicated CUDA stream so input copies can overlap with queued GPU work
+        self._stream = torch.cuda.Stream() if device.startswith("cuda") else None
+        if self.prefix_cache.enabled and model.generation_config.cache_implementation is not None:
+            logger.warning(
+                f"The {model.generation_config.cache_implementation} KV cache (MODEL_COMPILE) "
+                f"cannot be combined with a reused prefix; prefix cache reuse is disabled"
+            )
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Batch engine started: max_batch_size={self.max_batch_size}, "
+            f"max_wait={self.max_wait * 1000:.0f}ms"
+        )
+
+    async def shutdown(self):
+        """Stop the background task and fail any requests still queued."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._queue:
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if not item.future.done():
+                    item.future.set_exception(RuntimeError("Batch engine shut down"))
+                if item.token_queue is not None:
+                    item.token_queue.put_nowait(None)
+
+        self.prefix_cache.clear()
+
+        logger.info("Batch engine stopped")
+
+    async def submit(
+        self,
+        input_ids: Sequence[int],
+        generation_params: Dict[str, Any],
+        prefix_length: int = 0
+    ) -> BatchResult:
+        """
+        Queue a tokenized prompt for generation and wait for its result.
+
+        Args:
+            input_ids: Prompt token ids
+            generation_params: Keyword arguments for model.generate
+            prefix_length: Number of leading ids forming a shared system prefix
+
+        Returns:
+            Tuple of (generated texts, prompt token count, completion token count)
+        """
+        if self._queue is None:
+            raise RuntimeError("Batch engine not started")
+
+        future = asyncio.get_event_loop().create_future()
+        self._queue.put_nowait(BatchItem(list(input_ids), generation_params, future, None, prefix_length))
+        return await future
+
+    async def stream(
+        self,
+        input_ids: Sequence[int],
+        generation_params: Dict[str, Any],
+        prefix_length: int = 0
+    ) -> AsyncIterator[str]:
+        """
+        Queue a tokenized prompt for generation and yield its text as it is produced.
+
+        Closing the iterator early cancels the request, which finishes its
+        row of the batch at the next decode step. Deltas that queued up while
+        the consumer was busy are joined and yielded together, so a slow
+        client gets fewer, larger events.
+
+        Args:
+            input_ids: Prompt token ids
+            generation_params: Keyword arguments for model.generate
+            prefix_length: Number of leading ids forming a shared system prefix
+
+        Yields:
+            Generated text deltas
+        """
+        if self._queue is None:
+            raise RuntimeError("Batch engine not started")
+
+        future = asyncio.get_event_loop().create_future()
+        token_queue: asyncio.Queue = asyncio.Queue()
+        self._queue.put_nowait(BatchItem(list(input_ids), generation_params, future, token_queue, prefix_length))
+
+        try:
+            finished = False
+            while not finished and (text := await token_queue.get()) is not None:
+                while not token_queue.empty():
+                    queued = token_queue.get_nowait()
+                    if queued is None:
+                        finished = True
+                        break
+                    text += queued
+                yield text
+            # Surface generation errors once the stream has ended
+            await future
+        finally:
+            if not future.done():
+                future.cancel()
+
+    async def _run(self):
+        """Collect queued requests into batches and dispatch them."""
+        loop = asyncio.get_event_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # A batched generate call shares one set of sampling parameters and one
+            # cached prefix, and binning by prompt length keeps short prompts from
+            # padding out to long ones. Without prefix reuse, prompts with
+            # different prefixes can share a batch.
+            reuse_prefix = self._prefix_reuse_possible()
+            groups: Dict[tuple, List[BatchItem]] = {}
+            for item in sorted(batch, key=lambda item: len(item.input_ids)):
+                prefix = ()
+                if reuse_prefix:
+                    # Prefer a cached earlier turn of the same conversation over the system prefix
+                    prefix_length = self.prefix_cache.match_length(item.input_ids)
+                    if prefix_length > item.prefix_length:
+                        item = item._replace(prefix_length=prefix_length)
+                    prefix = tuple(item.input_ids[:item.prefix_length])
+                key = (
+                    _params_key(item.generation_params),
+                    _length_bin(len(item.input_ids)),
+                    prefix
+                )
+                groups.setdefault(key, []).append(item)
+
+            for items in groups.values():
+                await self._dispatch(items)
+
+    def _prefix_reuse_possible(self) -> bool:
+        """Whether any batch can reuse a cached prefix (a static cache cannot be mixed with one)."""
+        return self.prefix_cache.enabled and self.model.generation_config.cache_implementation is None
+
+    async def _dispatch(self, items: List[BatchItem]):
+        """Generate one group of requests and resolve their futures."""
+        # Skip requests whose callers have already gone away
+        items = [item for item in items if not item.future.cancelled()]
+        if not items:
+            return
+
+        try:
+            results = await run_in_generation_executor(
+                self._generate_batch,
+                items,
+                asyncio.get_event_loop()
+            )
+        except Exception as e:
+            logger.error(f"Error in batched generation: {str(e)}")
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+                if item.token_queue is not None:
+                    item.token_queue.put_nowait(None)
+            return
+
+        for item, result in zip(items, results):
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def _staging_buffers(self, numel: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Return reusable host buffers for a padded batch of numel elements.
+
+        The buffers grow to the next power of two and are kept between batches,
+        pinned on CUDA, so building a batch neither allocates nor pins memory.
+        They are only reused once the previous generate call has returned.
+        """
+        if self._staging is None or self._staging[0].numel() < numel:
+            capacity = 1 << (numel - 1).bit_length()
+            pin_memory = self._stream is not None
+            self._staging = (
+                torch.empty(capacity, dtype=torch.long, pin_memory=pin_memory),
+                torch.empty(capacity, dtype=torch.long, pin_memory=pin_memory)
+            )
+        ids_buffer, mask_buffer = self._staging
+        return ids_buffer[:numel], mask_buffer[:numel]
+
+    def _generate_batch(self, items: List[BatchItem], loop: asyncio.AbstractEventLoop) -> List[BatchResult]:
+        """Synchronously generate a padded batch of prompts sharing one set of parameters."""
+        batch_input_ids = [item.input_ids for item in items]
+        generation_params = items[0].generation_params
+        token_queues = [item.token_queue for item in items]
+
+        pad_token_id = self.tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.tokenizer.eos_token_id
+
+        # generate returns num_return_sequences consecutive rows per prompt
+        sequences = generation_params.get("num_return_sequences", 1)
+
+        # Assisted generation only handles a single sequence without a static
+        # cache; the draft model's proposals are verified in one forward pass
+        assisted = (
+            self.draft_model is not None
+            and len(items) == 1
+            and sequences == 1
+            and self.model.generation_config.cache_implementation is None
+        )
+        if assisted:
+            generation_params = {
+                **generation_params,
+                "assistant_model": self.draft_model,
+                "num_assistant_tokens": settings.NUM_ASSISTANT_TOKENS
+            }
+
+        # Reuse the KV cache of the shared prefix. generate does not expand a
+        # passed cache for multiple sequences, a static cache cannot be mixed
+        # with one, and the draft model would lack the matching prefix, so those
+        # batches prefill the whole prompt.
+        reuse_cache = self._prefix_reuse_possible() and not assisted and sequences == 1
+        prefix_length = items[0].prefix_length if reuse_cache else 0
+
+        # A lone prompt keeps its KV cache for the conversation's next turn, which
+        # needs cache positions to line up with the prompt ids, so it is not padded
+        keep_prompt_cache = reuse_cache and len(items) == 1
+
+        # Pad between the shared prefix and each prompt's remainder so every prompt
+        # ends at the same position (plain left padding when there is no prefix)
+        max_length = max(len(ids) for ids in batch_input_ids)
+        if not keep_prompt_cache:
+            max_length = -(-max_length // PAD_MULTIPLE) * PAD_MULTIPLE
+        ids_buffer, mask_buffer = self._staging_buffers(len(batch_input_ids) * max_length)
+        input_ids = ids_buffer.view(len(batch_input_ids), max_length).fill_(pad_token_id)
+        attention_mask = mask_buffer.view(len(batch_input_ids), max_length).zero_()
+        if prefix_length:
+            input_ids[:, :prefix_length] = torch.tensor(batch_input_ids[0][:prefix_length], dtype=torch.long)
+            attention_mask[:, :prefix_length] = 1
+        for row, ids in enumerate(batch_input_ids):
+            suffix = ids[prefix_length:]
+            input_ids[row, max_length - len(suffix):] = torch.tensor(suffix, dtype=torch.long)
+            attention_mask[row, max_length - len(suffix):] = 1
+
+        # Only decode incrementally when a request in the batch is streamed
+        streamer = None
+        if any(token_queue is not None for token_queue in token_queues):
+            streamer = BatchTextIteratorStreamer(
+                self.tokenizer,
+                [token_queue for token_queue in token_queues for _ in range(sequences)],
+                loop,
+                skip_special_tokens=True
+            )
+
+        with torch.cuda.stream(self._stream) if self._stream else nullcontext():
+            past_key_values = None
+            if prefix_length:
+                past_key_values = self.prefix_cache.get(
+                    self.model, batch_input_ids[0][:prefix_length], self.device, len(items)
+                )
+            if past_key_values is None and keep_prompt_cache:
+                past_key_values = DynamicCache()
+            if past_key_values is not None:
+                generation_params = {**generation_params, "past_key_values": past_key_values}
+
+            output = generate_tokens(
+                self.model,
+                input_ids=move_to_device(input_ids, self.device),
+                attention_mask=move_to_device(attention_mask, self.device),
+                pad_token_id=pad_token_id,
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList(
+                    [StopCancelledRows([item.future for item in items], sequences)]
+                ),
+                **generation_params
+            )
+
+            if keep_prompt_cache:
+                self.prefix_cache.put(batch_input_ids[0], past_key_values)
+
+        # Extract only the new tokens (exclude the input prompts)
+        new_tokens = output[:, max_length:]
+        texts = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+
+        # Count generated tokens for every row in one reduction and host copy
+        # instead of indexing into the tensor once per request
+        completion_counts = (new_tokens != pad_token_id).sum(dim=1).tolist()
+
+        results = []
+        for row, ids in enumerate(batch_input_ids):
+            start = row * sequences
+            results.append((texts[start:start + sequences], len(ids), completion_counts[start]))
+
+        return results
+
+
+# Global batch engine instance
+batch_engine = BatchEngine()
+
+# Made with Bob
@@ -4,11 +4,21 @@ Document processing service.
 This module handles document processing with caching support.
 """
 
+import asyncio
+import io
 import logging
 from typing import Dict, Any, List, Optional
 
+from core.config import settings
+
 logger = logging.getLogger(__name__)
 
+# Appended to document content cut at DOCUMENT_MAX_CHARS
+TRUNCATION_MARKER = "\n[truncated]"
+
+# Conversions in progress, keyed by document cache key
+_processing: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+
 
 def format_document_context(processed_files: List[Dict[str, Any]]) -> str:
     """
@@ -23,24 +33,42 @@ def format_document_context(processed_files: List[Dict[str, Any]]) -> str:
     if not processed_files:
         return ""
     
-    context_parts = ["=== ATTACHED DOCUMENTS ===\n"]
+    buffer = io.StringIO()
+    write_document_context(buffer, processed_files)
+    return buffer.getvalue()
+
+
+def write_document_context(buffer: io.StringIO, processed_files: List[Dict[str, Any]]):
+    """
+    Write processed documents as context for LLM into a caller's buffer.
+    
+    Args:
+        buffer: Buffer the formatted context is appended to
+        processed_files: List of processed file data dictionaries
+    """
+    max_chars = settings.DOCUMENT_MAX_CHARS
+    write = buffer.write
+    write("=== ATTACHED DOCUMENTS ===\n")
     
     for i, file_data in enumerate(processed_files, 1):
         metadata = file_data.get("metadata", {})
         markdown = file_data.get("markdown", "")
         
-        context_parts.append(f"\n--- Document {i}: {metadata.get('filename', 'Unknown')} ---")
-        context_parts.append(f"Format: {metadata.get('format', 'Unknown')}")
+        write(f"\n\n--- Document {i}: {metadata.get('filename', 'Unknown')} ---")
+        write(f"\nFormat: {metadata.get('format', 'Unknown')}")
         
         if metadata.get('page_count'):
-            context_parts.append(f"Pages: {metadata['page_count']}")
+            write(f"\nPages: {metadata['page_count']}")
         
-        context_parts.append(f"\nContent:\n{markdown}\n")
-        context_parts.append("--- End of Document ---\n")
+        write("\n\nContent:\n")
+        if max_chars and len(markdown) > max_chars:
+            write(markdown[:max_chars])
+            write(TRUNCATION_MARKER)
+        else:
+            write(markdown)
+        write("\n\n--- End of Document ---\n")
     
-    context_parts.append("\n=== END OF DOCUMENTS ===\n")
-    
-    return "\n".join(context_parts)
+    write("\n\n=== END OF DOCUMENTS ===\n")
 
 
 def prepare_prompt_with_context(
@@ -59,27 +87,25 @@ def prepare_prompt_with_context(
     Returns:
         Enhanced prompt with document context
     """
-    # Format document context
-    doc_context = format_document_context(processed_files)
+    if not processed_files:
+        return user_prompt
     
-    # Build instruction for the model
-    instruction = """You have been provided with document(s) as reference material.
+    # Build the instruction, document context and question in one buffer so
+    # the (possibly large) document text is copied only once
+    buffer = io.StringIO()
+    buffer.write("""You have been provided with document(s) as reference material.
 Please analyze the documents and answer the user's question based on the information provided.
-If the answer cannot be found in the documents, please state that clearly."""
-    
-    # Combine all parts
-    if doc_context:
-        enhanced_prompt = f"""{instruction}
+If the answer cannot be found in the documents, please state that clearly.
 
-{doc_context}
+""")
+    write_document_context(buffer, processed_files)
+    buffer.write(f"""
 
 User Question: {user_prompt}
 
-Please provide a detailed answer based on the documents above."""
-    else:
-        enhanced_prompt = user_prompt
+Please provide a detailed answer based on the documents above.""")
     
-    return enhanced_prompt
+    return buffer.getvalue()
 
 
 async def process_document_with_cache(
@@ -90,6 +116,13 @@ async def process_document_with_cache(
     """
     Process document with caching support.
     
+    Runs on the upload path, so it never sweeps expired entries or old
+    files; that is left to the cleanup scheduler.
+    
+    Concurrent requests for the same content share one conversion. The
+    conversion is shielded, so a caller that goes away does not cancel it
+    for the others, and its result is still cached.
+    
     Args:
         file_path: Path to the document file
         cache_manager: CacheManager instance
@@ -104,11 +137,23 @@ async def process_document_with_cache(
         logger.info(f"Cache hit for {file_path}")
         return cached
     
-    # Process document
-    logger.info(f"Cache miss for {file_path}, processing...")
+    key = cache_manager.get_key(file_path)
+    task = _processing.get(key)
+    if task is None:
+        logger.info(f"Cache miss for {file_path}, processing...")
+        task = asyncio.ensure_future(_process_and_cache(file_path, cache_manager, docling_processor))
+        _processing[key] = task
+        task.add_done_callback(lambda _: _processing.pop(key, None))
+    else:
+        logger.info(f"Joining in-progress conversion for {file_path}")
+    
+    return await asyncio.shield(task)
+
+
+async def _process_and_cache(file_path: str, cache_manager, docling_processor) -> Dict[str, Any]:
+    """Convert a document and cache the result if it succeeded"""
     result = await docling_processor.process_document(file_path)
     
-    # Cache result
     if result.get("success"):
         cache_manager.set(file_path, result)
     
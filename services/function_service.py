@@ -7,18 +7,72 @@ that the model can use.
 
 import logging
 import inspect
-from typing import Dict, Any, List, Optional, Callable
+import orjson
+from types import MappingProxyType
+from pydantic import BaseModel, ValidationError, create_model
+from typing import Dict, Any, List, Literal, Mapping, Optional, Callable, Type
 
 logger = logging.getLogger(__name__)
 
+# JSON schema parameter types and the Python types they validate as
+_SCHEMA_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": float,
+    "boolean": bool,
+    "array": list,
+    "object": dict
+}
+
+
+def _build_arguments_model(name: str, parameters: Dict[str, Any]) -> Type[BaseModel]:
+    """
+    Build a pydantic model that validates a function's arguments.
+    
+    Args:
+        name: Function name
+        parameters: Parameter definitions passed to register()
+        
+    Returns:
+        Model class with one field per parameter
+    """
+    fields = {}
+    for param_name, param_def in parameters.items():
+        if "enum" in param_def:
+            param_type = Literal[tuple(param_def["enum"])]
+        else:
+            param_type = _SCHEMA_TYPES.get(param_def.get("type", "string"), Any)
+        if param_def.get("required", False):
+            fields[param_name] = (param_type, ...)
+        else:
+            fields[param_name] = (Optional[param_type], None)
+    return create_model(f"{name}_arguments", **fields)
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    """Turn the first validation error into a message for the model"""
+    detail = error.errors()[0]
+    param_name = ".".join(str(part) for part in detail["loc"])
+    if detail["type"] == "missing":
+        return f"Missing required parameter: {param_name}"
+    return f"Invalid value for parameter {param_name}: {detail['msg']}"
+
 
 class FunctionRegistry:
     """
     Registry for managing available functions that the model can call.
+    
+    The function table is an immutable snapshot that register and unregister
+    replace as a whole, so readers never see it change while iterating.
     """
     
     def __init__(self):
-        self.functions: Dict[str, Dict[str, Any]] = {}
+        self.functions: Mapping[str, Dict[str, Any]] = MappingProxyType({})
+        # Incremented on every mutation so callers can key caches on it
+        self.version = 0
+        self._functions_cache: Optional[List[Dict[str, Any]]] = None
+        self._tools_cache: Optional[List[Dict[str, Any]]] = None
+        self._tools_json_cache: Optional[bytes] = None
         
     def register(
         self,
@@ -28,13 +82,36 @@ class FunctionRegistry:
         handler: Callable
     ):
         """Register a new function"""
-        self.functions[name] = {
+        functions = dict(self.functions)
+        functions[name] = {
             "name": name,
             "description": description,
             "parameters": parameters,
-            "handler": handler
+            "arguments_model": _build_arguments_model(name, parameters),
+            "handler": handler,
+            "is_async": inspect.iscoroutinefunction(handler)
         }
+        self.functions = MappingProxyType(functions)
+        self._invalidate()
         logger.info(f"Registered function: {name}")
+    
+    def unregister(self, name: str) -> bool:
+        """Remove a function, returning whether it was registered"""
+        if name not in self.functions:
+            return False
+        self.functions = MappingProxyType({
+            other: func for other, func in self.functions.items() if other != name
+        })
+        self._invalidate()
+        logger.info(f"Unregistered function: {name}")
+        return True
+    
+    def _invalidate(self):
+        """Drop cached function listings after the registry changes"""
+        self.version += 1
+        self._functions_cache = None
+        self._tools_cache = None
+        self._tools_json_cache = None
         
     def get_function(self, name: str) -> Optional[Dict[str, Any]]:
         """Get function definition by name"""
@@ -47,18 +124,15 @@ class FunctionRegistry:
             return {"success": False, "error": f"Function '{name}' not found"}
             
         try:
-            # Validate required parameters
-            params_schema = func["parameters"]
-            for param_name, param_def in params_schema.items():
-                if param_def.get("required", False) and param_name not in arguments:
-                    return {
-                        "success": False,
-                        "error": f"Missing required parameter: {param_name}"
-                    }
+            # Validate and coerce arguments; omitted optional parameters keep the handler defaults
+            try:
+                arguments = func["arguments_model"].model_validate(arguments).model_dump(exclude_unset=True)
+            except ValidationError as e:
+                return {"success": False, "error": _format_validation_error(e)}
             
             # Execute the function (handle both sync and async)
             handler = func["handler"]
-            if inspect.iscoroutinefunction(handler):
+            if func["is_async"]:
                 result = await handler(**arguments)
             else:
                 result = handler(**arguments)
@@ -70,18 +144,23 @@ class FunctionRegistry:
             return {"success": False, "error": str(e)}
             
     def get_all_functions(self) -> List[Dict[str, Any]]:
-        """Get all registered functions"""
-        return [
-            {
-                "name": func["name"],
-                "description": func["description"],
-                "parameters": func["parameters"]
-            }
-            for func in self.functions.values()
-        ]
+        """Get all registered functions (cached until the registry changes)"""
+        if self._functions_cache is None:
+            self._functions_cache = [
+                {
+                    "name": func["name"],
+                    "description": func["description"],
+                    "parameters": func["parameters"]
+                }
+                for func in self.functions.values()
+            ]
+        return self._functions_cache
         
     def get_tools_schema(self) -> List[Dict[str, Any]]:
-        """Get functions in OpenAI tools format"""
+        """Get functions in OpenAI tools format (cached until the registry changes)"""
+        if self._tools_cache is not None:
+            return self._tools_cache
+        
         tools = []
         for func in self.functions.values():
             # Convert parameters to JSON schema format
@@ -110,6 +189,13 @@ class FunctionRegistry:
                     }
                 }
             })
+        self._tools_cache = tools
         return tools
+    
+    def get_tools_schema_json(self) -> bytes:
+        """Get the tools schema serialized as JSON bytes (cached until the registry changes)"""
+        if self._tools_json_cache is None:
+            self._tools_json_cache = orjson.dumps(self.get_tools_schema())
+        return self._tools_json_cache
 
 # Made with Bob
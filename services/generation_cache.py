@@ -0,0 +1,87 @@
+"""
+Exact-match response cache for the text generation endpoint.
+
+This module stores /generate responses keyed by a hash of the prompt and
+generation parameters so repeated requests skip the model entirely.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import orjson
+
+from core.config import settings
+from schemas.generation import GenerationRequest, GenerationResponse
+
+logger = logging.getLogger(__name__)
+
+
+def _request_key(request: GenerationRequest) -> bytes:
+    """Hash the prompt together with every generation parameter."""
+    params = request.model_dump(exclude={"prompt"})
+    payload = request.prompt.encode() + orjson.dumps(params, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+class GenerationCache:
+    """Bounded LRU mapping of request hashes to generation responses."""
+
+    def __init__(
+        self,
+        enabled: bool = settings.GENERATION_CACHE_ENABLED,
+        max_entries: int = settings.GENERATION_CACHE_MAX_ENTRIES
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[bytes, GenerationResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, request: GenerationRequest) -> Optional[GenerationResponse]:
+        """
+        Return the cached response for an identical request.
+
+        Args:
+            request: Incoming generation request
+
+        Returns:
+            Copy of the cached response with zero execution time, or None
+        """
+        if not self.enabled:
+            return None
+
+        key = _request_key(request)
+        with self._lock:
+            response = self.entries.get(key)
+            if response is None:
+                return None
+            self.entries.move_to_end(key)
+
+        logger.debug("Generation cache hit")
+        return response.model_copy(update={"execution_time": 0.0})
+
+    def set(self, request: GenerationRequest, response: GenerationResponse):
+        """
+        Store a generated response.
+
+        Args:
+            request: Generation request that produced the response
+            response: Response to cache
+        """
+        if not self.enabled:
+            return
+
+        key = _request_key(request)
+        with self._lock:
+            self.entries[key] = response
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+# Global generation cache instance
+generation_cache = GenerationCache()
+
+# Made with Bob
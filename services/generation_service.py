@@ -4,13 +4,20 @@ Text generation service.
 This module handles text generation logic including streaming support.
 """
 
+import asyncio
+import itertools
 import logging
 import time
 import json
-from typing import Dict, Any, AsyncIterator, Callable, Optional
-from contextlib import contextmanager
-from threading import Thread
-from transformers import TextIteratorStreamer
+from datetime import datetime
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Dict, Any, AsyncIterator, Callable, List, NamedTuple, Optional, Sequence, Tuple, Union
+import torch
+
+from core.config import settings
+from schemas.chat import ChatMessage
 
 logger = logging.getLogger(__name__)
 
@@ -25,127 +32,459 @@ DISCONNECTION_EXCEPTIONS = (
 # Thread management timeout (seconds)
 GENERATION_THREAD_TIMEOUT = 1.0
 
+# Server-sent event framing; each token delta is one self-contained event
+_EVENT_PREFIX = b"data: "
+_EVENT_SUFFIX = b"\n\n"
+_EVENT_DONE = b"data: [DONE]\n\n"
+
+# Stream ids are the process start time plus a per-process counter
+_STREAM_ID_PREFIX = f"stream-{int(time.time())}-"
+_stream_counter = itertools.count()
+
+# Single worker so blocking generate calls never oversubscribe the model device
+_generation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="generation")
+
+# Chat template rendering and tokenization get their own threads so they never
+# queue behind file I/O or embedding work on the default executor
+_tokenizer_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tokenizer")
+
+
+class RenderedPrompt(NamedTuple):
+    """A chat prompt rendered with the chat template and tokenized."""
+    
+    text: str
+    input_ids: Tuple[int, ...]
+    # Number of leading token ids that make up the system turn (0 if none)
+    prefix_length: int
+
 
 def _create_stream_id() -> str:
     """
-    Generate a unique stream ID based on current timestamp.
+    Generate a unique stream ID from the process start time and a counter.
     
     Returns:
-        str: Unique stream identifier in format 'stream-{timestamp}'
+        str: Unique stream identifier in format 'stream-{start timestamp}-{counter}'
     """
-    return f"stream-{int(time.time())}"
+    return _STREAM_ID_PREFIX + str(next(_stream_counter))
 
 
-def _create_token_chunk(index: int, content: str, finish_reason: Optional[str] = None) -> str:
+def _create_token_event(
+    stream_id: str,
+    index: int,
+    content: Optional[str],
+    finish_reason: Optional[str] = None
+) -> bytes:
     """
-    Create a JSON-formatted chunk for a single token.
+    Create a server-sent event for a single token.
     
     Args:
+        stream_id: Identifier shared by all events of the stream
         index: Token index in the stream
-        content: Token content/text
+        content: Token content/text, or None for the final event
         finish_reason: Optional finish reason (e.g., 'stop', 'length')
     
     Returns:
-        str: JSON-formatted chunk string
+        bytes: 'data: <json>' event with its blank-line terminator
     """
-    chunk = {
+    return _EVENT_PREFIX + orjson.dumps({
+        "id": stream_id,
         "index": index,
-        "delta": {"content": content},
+        "delta": {"content": content} if content is not None else {},
         "finish_reason": finish_reason
-    }
-    return json.dumps(chunk)
+    }) + _EVENT_SUFFIX
 
 
-def _safe_stop_streamer(streamer: TextIteratorStreamer) -> None:
+def _create_delta_event(event_head: bytes, index: int, content: str) -> bytes:
     """
-    Safely stop the streamer if it has an end method.
+    Create the server-sent event for a token delta without building a dict.
+    
+    Produces the same JSON as _create_token_event; only the content string
+    goes through the serializer, for escaping.
     
     Args:
-        streamer: TextIteratorStreamer instance to stop
+        event_head: Event prefix up to the index, built once per stream
+        index: Token index in the stream
+        content: Token content/text
+    
+    Returns:
+        bytes: 'data: <json>' event with its blank-line terminator
     """
-    if hasattr(streamer, 'end'):
-        try:
-            streamer.end()
-        except Exception as e:
-            logger.debug(f"Error stopping streamer: {e}")
+    return b"".join((
+        event_head, str(index).encode(), b',"delta":{"content":', orjson.dumps(content),
+        b'},"finish_reason":null}', _EVENT_SUFFIX
+    ))
 
 
-@contextmanager
-def _managed_generation_thread(
-    target: Callable,
-    kwargs: Dict[str, Any],
-    timeout: float = GENERATION_THREAD_TIMEOUT
-):
+async def create_token_generator(tokens: AsyncIterator[str]) -> AsyncIterator[bytes]:
     """
-    Context manager for generation thread lifecycle management.
-    
-    Ensures the thread is properly started and cleaned up, even if exceptions occur.
+    Stream text deltas as server-sent events in OpenAI's streaming format.
     
     Args:
-        target: Function to run in the thread
-        kwargs: Keyword arguments for the target function
-        timeout: Maximum time to wait for thread completion (seconds)
-    
+        tokens: Async iterator of generated text deltas (e.g. BatchEngine.stream)
+        
     Yields:
-        Thread: The started generation thread
+        One 'data:' event per token, a final event carrying the finish
+        reason, and a closing 'data: [DONE]' event
     """
-    thread = Thread(target=target, kwargs=kwargs)
-    thread.start()
     try:
-        yield thread
+        stream_id = _create_stream_id()
+        event_head = _EVENT_PREFIX + b'{"id":' + orjson.dumps(stream_id) + b',"index":'
+        
+        # Stream tokens with index tracking
+        index = 0
+        async for token in tokens:
+            yield _create_delta_event(event_head, index, token)
+            index += 1
+        
+        yield _create_token_event(stream_id, index, None, "stop")
+        yield _EVENT_DONE
+        
+    except DISCONNECTION_EXCEPTIONS as e:
+        # Client disconnected - this is expected when user stops generation
+        logger.debug("Client disconnected during streaming: %s", type(e).__name__)
+        
+    except Exception as e:
+        # Log unexpected errors but don't crash
+        logger.error(f"Error during token streaming: {str(e)}")
+    
     finally:
-        if thread.is_alive():
-            thread.join(timeout=timeout)
+        # Close the token source so an abandoned request leaves its batch
+        await tokens.aclose()
 
 
-async def create_token_generator(
-    model,
-    streamer: TextIteratorStreamer,
-    generation_kwargs: Dict[str, Any]
-) -> AsyncIterator[str]:
+def generate_tokens(model, **generation_kwargs):
     """
-    Create an async generator that streams tokens from the model.
+    Call model.generate under torch.inference_mode.
+    
+    inference_mode is thread-local, so this wrapper is also what generation
+    threads should run instead of model.generate directly.
     
     Args:
         model: The language model
-        streamer: TextIteratorStreamer instance
-        generation_kwargs: Generation parameters
+        **generation_kwargs: Keyword arguments for model.generate
         
-    Yields:
-        JSON-formatted chunks containing generated tokens
+    Returns:
+        Generated token ids
     """
-    try:
-        # Yield opening JSON structure
-        yield f'{{"id": "{_create_stream_id()}", "choices": ['
+    with torch.inference_mode():
+        return model.generate(**generation_kwargs)
+
+
+def move_to_device(tensor: torch.Tensor, device: str) -> torch.Tensor:
+    """
+    Copy a CPU tensor to the model device.
+    
+    On CUDA the tensor is pinned first so the host-to-device copy is
+    asynchronous and can overlap with work already queued on the GPU.
+    
+    Args:
+        tensor: CPU tensor to copy
+        device: Target device
         
-        # Use context manager for thread lifecycle management
-        with _managed_generation_thread(model.generate, generation_kwargs):
-            # Stream tokens with index tracking
-            for index, token in enumerate(streamer):
-                # Add comma separator between chunks (except first)
-                if index > 0:
-                    yield ','
-                yield _create_token_chunk(index, token)
+    Returns:
+        Tensor on the target device
+    """
+    if device.startswith("cuda"):
+        return tensor.pin_memory().to(device, non_blocking=True)
+    return tensor.to(device)
+
+
+async def run_in_generation_executor(func: Callable, *args) -> Any:
+    """
+    Run a blocking model call on the dedicated generation executor.
+    
+    Keeps the event loop free while the model is busy so other requests
+    (health checks, uploads, streaming setup) can be served concurrently.
+    
+    Args:
+        func: Blocking callable that uses the model
+        *args: Positional arguments for the callable
         
-        # Yield closing JSON structure
-        yield '], "finish_reason": "stop"}'
+    Returns:
+        The callable's return value
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(_generation_executor, partial(func, *args))
+
+
+def _extend_prefix(
+    tokenizer,
+    formatted_prompt: str,
+    prefix_prompt: str,
+    prefix_ids: Tuple[int, ...]
+) -> Optional[Tuple[int, ...]]:
+    """
+    Tokenize a prompt by reusing the token ids of a rendered prefix.
+    
+    Args:
+        tokenizer: The model tokenizer
+        formatted_prompt: Full rendered prompt
+        prefix_prompt: Previously rendered prefix text
+        prefix_ids: Token ids of the prefix text
         
-    except DISCONNECTION_EXCEPTIONS as e:
-        # Client disconnected - this is expected when user stops generation
-        logger.info(f"Client disconnected during streaming: {type(e).__name__}")
-        _safe_stop_streamer(streamer)
+    Returns:
+        Token ids of the full prompt, or None if the prefix does not match
+    """
+    if not formatted_prompt.startswith(prefix_prompt):
+        return None
+    tail_ids = tokenizer(formatted_prompt[len(prefix_prompt):], add_special_tokens=False)["input_ids"]
+    return prefix_ids + tuple(tail_ids)
+
+
+@lru_cache(maxsize=64)
+def _render_system_prefix(
+    tokenizer,
+    system_prompt: str,
+    tools_json: Optional[bytes]
+) -> Tuple[str, Tuple[int, ...]]:
+    """
+    Render and tokenize a system message on its own, shared across conversations.
+    
+    Args:
+        tokenizer: The model tokenizer
+        system_prompt: System message content
+        tools_json: Tools serialized with sorted keys, or None
         
-    except Exception as e:
-        # Log unexpected errors but don't crash
-        logger.error(f"Error during token streaming: {str(e)}")
-        _safe_stop_streamer(streamer)
+    Returns:
+        Tuple of (rendered system turn, its token ids)
+    """
+    tools = orjson.loads(tools_json) if tools_json else None
+    prefix_prompt = tokenizer.apply_chat_template(
+        [{"role": "system", "content": system_prompt}],
+        tokenize=False, add_generation_prompt=False, tools=tools
+    )
+    return prefix_prompt, tuple(tokenizer(prefix_prompt)["input_ids"])
+
+
+@lru_cache(maxsize=64)
+def _render_anchor(tokenizer, tools_json: Optional[bytes]) -> Optional[Tuple[str, str]]:
+    """
+    Render the pieces used to template new messages without the history.
+    
+    New messages are rendered after an empty system turn (the anchor), whose
+    own rendering is then cut off. A probe conversation checks that the chat
+    template renders messages independently of their position, which is what
+    makes the concatenation match a full render.
+    
+    Args:
+        tokenizer: The model tokenizer
+        tools_json: Tools serialized with sorted keys, or None
+        
+    Returns:
+        Tuple of (rendered anchor, generation prompt suffix), or None if the
+        template cannot be rendered incrementally
+    """
+    tools = orjson.loads(tools_json) if tools_json else None
+    
+    def render(messages, add_generation_prompt):
+        return tokenizer.apply_chat_template(
+            [{"role": role, "content": content} for role, content in messages],
+            tokenize=False, add_generation_prompt=add_generation_prompt, tools=tools
+        )
+    
+    anchor = (("system", ""),)
+    anchor_text = render(anchor, False)
+    generation_prompt = render(anchor, True)[len(anchor_text):]
+    
+    probe = (("system", "s"), ("user", "u"), ("assistant", "a"), ("user", "v"))
+    expected = render(probe, True)
+    head = render(probe[:2], True)
+    tail = render(anchor + probe[2:], True)
+    if (
+        not head.endswith(generation_prompt)
+        or not tail.startswith(anchor_text)
+        or head[:len(head) - len(generation_prompt)] + tail[len(anchor_text):] != expected
+    ):
+        logger.info("Chat template does not support incremental rendering")
+        return None
+    
+    return anchor_text, generation_prompt
+
+
+def _render_incremental(
+    tokenizer,
+    previous_prompt: str,
+    new_messages: Tuple[Tuple[str, str], ...],
+    tools_json: Optional[bytes]
+) -> Optional[str]:
+    """
+    Render a conversation by appending its newest messages to a rendered prefix.
+    
+    Args:
+        tokenizer: The model tokenizer
+        previous_prompt: Rendered earlier part of the conversation, with generation prompt
+        new_messages: Messages added since, as (role, content) pairs
+        tools_json: Tools serialized with sorted keys, or None
+        
+    Returns:
+        Rendered prompt, or None if the template must render the whole conversation
+    """
+    rendered_anchor = _render_anchor(tokenizer, tools_json)
+    if rendered_anchor is None:
+        return None
+    anchor_text, generation_prompt = rendered_anchor
+    
+    tail = tokenizer.apply_chat_template(
+        [{"role": "system", "content": ""}] + [{"role": role, "content": content} for role, content in new_messages],
+        tokenize=False, add_generation_prompt=True, tools=orjson.loads(tools_json) if tools_json else None
+    )
+    return previous_prompt[:len(previous_prompt) - len(generation_prompt)] + tail[len(anchor_text):]
+
+
+@lru_cache(maxsize=1024)
+def _render_prompt(
+    tokenizer,
+    messages_key: Tuple[Tuple[str, str], ...],
+    tools_json: Optional[bytes]
+) -> RenderedPrompt:
+    """
+    Apply the chat template and tokenize, memoized per conversation.
+    
+    A follow-up turn appends an assistant reply and a new user message, so the
+    previous request (all but the last two messages) renders to a prefix of this
+    one. Only those two messages are templated and tokenized, and the result is
+    appended to the cached prefix. New conversations still reuse the tokenized
+    system message, which is identical across requests with the same system
+    prompt and functions.
+    
+    The length of that system turn is returned as well, so generation can
+    reuse a cached KV prefix for it.
+    
+    Args:
+        tokenizer: The model tokenizer
+        messages_key: Chat messages as (role, content) pairs
+        tools_json: Tools serialized with sorted keys, or None
+        
+    Returns:
+        RenderedPrompt with the formatted prompt, token ids and system prefix length
+    """
+    formatted_prompt = None
+    input_ids = None
+    if len(messages_key) > 2:
+        previous = _render_prompt(tokenizer, messages_key[:-2], tools_json)
+        formatted_prompt = _render_incremental(tokenizer, previous.text, messages_key[-2:], tools_json)
+        if formatted_prompt is not None:
+            input_ids = _extend_prefix(tokenizer, formatted_prompt, previous.text, previous.input_ids)
+    
+    if formatted_prompt is None:
+        chat = [{"role": role, "content": content} for role, content in messages_key]
+        tools = orjson.loads(tools_json) if tools_json else None
+        formatted_prompt = tokenizer.apply_chat_template(
+            chat, tokenize=False, add_generation_prompt=True, tools=tools
+        )
+    
+    system_prompt, system_ids = "", ()
+    if messages_key[0][0] == "system":
+        system_prompt, system_ids = _render_system_prefix(tokenizer, messages_key[0][1], tools_json)
+    
+    if input_ids is None and system_ids:
+        input_ids = _extend_prefix(tokenizer, formatted_prompt, system_prompt, system_ids)
+    
+    if input_ids is None:
+        input_ids = tuple(tokenizer(formatted_prompt)["input_ids"])
+    
+    prefix_length = len(system_ids) if input_ids[:len(system_ids)] == system_ids else 0
+    return RenderedPrompt(formatted_prompt, input_ids, prefix_length)
+
+
+async def render_chat_prompt(
+    tokenizer,
+    chat: Sequence[Union[Dict[str, Any], ChatMessage]],
+    tools: Optional[List[Dict[str, Any]]] = None
+) -> RenderedPrompt:
+    """
+    Render and tokenize chat messages on the tokenizer thread pool.
+    
+    Args:
+        tokenizer: The model tokenizer
+        chat: Chat messages as dicts or ChatMessage models
+        tools: Optional tools passed to the chat template
+        
+    Returns:
+        RenderedPrompt with the formatted prompt, token ids and system prefix length
+    """
+    messages_key = tuple(
+        (msg.role, msg.content) if isinstance(msg, ChatMessage) else (msg["role"], msg["content"])
+        for msg in chat
+    )
+    tools_json = orjson.dumps(tools, option=orjson.OPT_SORT_KEYS) if tools else None
+    
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        _tokenizer_executor, _render_windowed_prompt, tokenizer, messages_key, tools_json
+    )
+
+
+def _render_windowed_prompt(
+    tokenizer,
+    messages_key: Tuple[Tuple[str, str], ...],
+    tools_json: Optional[bytes]
+) -> RenderedPrompt:
+    """
+    Render a conversation, dropping its oldest turns to fit the context window.
+    
+    Like an attention-sink window, the system message (the sink) and the most
+    recent turns are kept while the middle of the conversation is evicted, so
+    prompt length and KV cache size stay bounded for long chats.
+    
+    Args:
+        tokenizer: The model tokenizer
+        messages_key: Chat messages as (role, content) pairs
+        tools_json: Tools serialized with sorted keys, or None
+        
+    Returns:
+        RenderedPrompt for the (possibly shortened) conversation
+    """
+    prompt = _render_prompt(tokenizer, messages_key, tools_json)
+    budget = settings.CONTEXT_WINDOW_TOKENS
+    if not budget or len(prompt.input_ids) <= budget:
+        return prompt
+    
+    # Estimate each message's share of the prompt from one batched tokenization
+    # of the contents, so the cut point is found without rendering every
+    # shortened conversation
+    overhead = _message_overhead(tokenizer)
+    contents = [content for _, content in messages_key]
+    lengths = [len(ids) + overhead for ids in tokenizer(contents, add_special_tokens=False)["input_ids"]]
+    
+    start = 1 if messages_key[0][0] == "system" else 0
+    cut = start
+    total = len(prompt.input_ids)
+    while total > budget and len(messages_key) - cut > 1:
+        while total > budget and len(messages_key) - cut > 1:
+            # Evict the oldest turn, never leaving an assistant reply first
+            total -= lengths[cut]
+            cut += 1
+            while len(messages_key) - cut > 1 and messages_key[cut][0] == "assistant":
+                total -= lengths[cut]
+                cut += 1
+        # Render the kept window; the estimate is only off by a few tokens
+        # per message, so this rarely needs another pass
+        prompt = _render_prompt(tokenizer, messages_key[:start] + messages_key[cut:], tools_json)
+        total = len(prompt.input_ids)
+    
+    return prompt
+
+
+@lru_cache(maxsize=8)
+def _message_overhead(tokenizer) -> int:
+    """Count the tokens the chat template adds around one message's content."""
+    one, two = (
+        tokenizer.apply_chat_template(
+            [{"role": "user", "content": ""}] * count, tokenize=False, add_generation_prompt=False
+        )
+        for count in (1, 2)
+    )
+    return len(tokenizer(two, add_special_tokens=False)["input_ids"]) - len(
+        tokenizer(one, add_special_tokens=False)["input_ids"]
+    )
 
 
 def prepare_generation_params(
     max_tokens: int,
     temperature: float,
-    top_p: float,
-    do_sample: bool,
+    top_p: Optional[float] = None,
+    do_sample: Optional[bool] = None,
     top_k: Optional[int] = None,
     repetition_penalty: Optional[float] = None,
     num_return_sequences: Optional[int] = None
@@ -153,11 +492,15 @@ def prepare_generation_params(
     """
     Prepare generation parameters from request values.
     
+    Sampling is only enabled when requested (or, if do_sample is None, implied
+    by a positive temperature). Greedy decoding omits temperature/top_p/top_k
+    so generate does not build logits warpers it would never use.
+    
     Args:
         max_tokens: Maximum number of tokens to generate
         temperature: Sampling temperature
-        top_p: Nucleus sampling parameter
-        do_sample: Whether to use sampling
+        top_p: Optional nucleus sampling parameter
+        do_sample: Whether to use sampling (defaults to temperature > 0)
         top_k: Optional top-k sampling parameter
         repetition_penalty: Optional repetition penalty
         num_return_sequences: Optional number of sequences to return
@@ -165,20 +508,26 @@ def prepare_generation_params(
     Returns:
         Dictionary of generation parameters
     """
-    params = {
-        "max_new_tokens": max_tokens,
-        "temperature": temperature,
-        "top_p": top_p,
-        "do_sample": do_sample,
-    }
+    params = {"max_new_tokens": max_tokens}
+    
+    if do_sample is None:
+        do_sample = temperature > 0.0
+    
+    if do_sample and temperature > 0.0:
+        params["do_sample"] = True
+        params["temperature"] = temperature
+        if top_p is not None:
+            params["top_p"] = top_p
+        if top_k is not None:
+            params["top_k"] = top_k
+    else:
+        params["do_sample"] = False
     
     if num_return_sequences is not None:
         params["num_return_sequences"] = num_return_sequences
     else:
         params["num_return_sequences"] = 1
         
-    if top_k is not None:
-        params["top_k"] = top_k
     if repetition_penalty is not None:
         params["repetition_penalty"] = repetition_penalty
         
@@ -198,8 +547,50 @@ def format_chat_prompt(prompt: str) -> list:
     return [{"role": "user", "content": prompt}]
 
 
+@lru_cache(maxsize=8)
+def _default_system_prompt_parts(function_registry, version: int) -> Optional[Tuple[str, str]]:
+    """
+    Build the default system prompt around its date and time slot.
+    
+    Cached per registry version, so the function descriptions are only
+    serialized again after the registry changes.
+    
+    Args:
+        function_registry: Function registry instance for available functions
+        version: Registry version the prompt is built for
+        
+    Returns:
+        Tuple of (text before the date and time, text after it), or None if
+        no functions are registered
+    """
+    available_functions = function_registry.get_all_functions()
+    if not available_functions:
+        return None
+    
+    functions_desc = "\n".join([
+        f"- {func['name']}: {func['description']}\n  Parameters: {json.dumps(func['parameters'])}"
+        for func in available_functions
+    ])
+    
+    head = f"""You are a helpful assistant with access to the following functions:
+
+{functions_desc}
+
+Current date and time: """
+    tail = """
+
+When you need to use a function, respond with:
+<function_call>
+{"name": "function_name", "arguments": {"param1": "value1", "param2": "value2"}}
+</function_call>
+
+You can include reasoning text before the function call to explain what you're doing.
+After the function executes, you'll receive the result and can continue the conversation."""
+    return head, tail
+
+
 def format_chat_messages(
-    messages: list,
+    messages: List[ChatMessage],
     custom_system_prompt: Optional[str],
     function_registry
 ) -> list:
@@ -207,15 +598,13 @@ def format_chat_messages(
     Format chat messages with system prompt and function calling instructions.
     
     Args:
-        messages: List of chat messages from the request
+        messages: Chat messages from the request
         custom_system_prompt: Optional custom system prompt
         function_registry: Function registry instance for available functions
         
     Returns:
         List of formatted chat messages
     """
-    from datetime import datetime
-    
     chat = []
     
     # Add system message
@@ -224,45 +613,28 @@ def format_chat_messages(
         chat.append({"role": "system", "content": custom_system_prompt})
     else:
         # Use default system message with function calling instructions
-        available_functions = function_registry.get_all_functions()
-        if available_functions:
-            functions_desc = "\n".join([
-                f"- {func['name']}: {func['description']}\n  Parameters: {json.dumps(func['parameters'])}"
-                for func in available_functions
-            ])
-            
-            # Get current date and time
-            current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            system_message = f"""You are a helpful assistant with access to the following functions:
-
-{functions_desc}
-
-Current date and time: {current_datetime}
-
-When you need to use a function, respond with:
-<function_call>
-{{"name": "function_name", "arguments": {{"param1": "value1", "param2": "value2"}}}}
-</function_call>
-
-You can include reasoning text before the function call to explain what you're doing.
-After the function executes, you'll receive the result and can continue the conversation."""
+        system_prompt_parts = _default_system_prompt_parts(function_registry, function_registry.version)
+        if system_prompt_parts is not None:
+            # Get current date and time (minute precision keeps the system
+            # prompt, and therefore its cached tokenization, stable for a minute)
+            current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M")
             
-            chat.append({"role": "system", "content": system_message})
+            head, tail = system_prompt_parts
+            chat.append({"role": "system", "content": head + current_datetime + tail})
     
     # Add user messages and handle function results
     for msg in messages:
         # Convert function role to user role with special formatting
-        if msg["role"] == "function":
-            function_name = msg.get("name", "unknown_function")
-            function_content = msg["content"]
+        if msg.role == "function":
+            function_name = msg.name or "unknown_function"
+            function_content = msg.content
             # Format function result as a user message so the model can process it
             chat.append({
                 "role": "user",
                 "content": f"Function '{function_name}' returned:\n{function_content}"
             })
         else:
-            chat.append({"role": msg["role"], "content": msg["content"]})
+            chat.append({"role": msg.role, "content": msg.content})
     
     return chat
 
@@ -0,0 +1,106 @@
+"""
+Shared HTTP client for external API calls.
+
+This module owns a single httpx.AsyncClient so the weather, geocoding and
+search services reuse pooled keep-alive connections instead of opening a
+new connection (and TLS handshake) for every call.
+"""
+
+import logging
+from typing import Any, Dict, NamedTuple, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Default timeout in seconds; individual requests may override it
+HTTP_TIMEOUT = 10.0
+
+# Largest response body read from an external API (bytes)
+MAX_RESPONSE_BYTES = 2 * 1024 * 1024
+
+
+class CappedResponse(NamedTuple):
+    """Status and body of a response read up to MAX_RESPONSE_BYTES."""
+    
+    status_code: int
+    content: bytes
+
+
+class ResponseTooLargeError(Exception):
+    """Raised when a response body exceeds MAX_RESPONSE_BYTES."""
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _create_client() -> httpx.AsyncClient:
+    """Create the pooled client used for all outbound requests."""
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_keepalive_connections=20,
+            max_connections=100,
+            keepalive_expiry=30
+        ),
+        headers={"User-Agent": "GraniteChat/1.0"},
+        http2=True
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client, creating it on first use.
+    
+    Returns:
+        Shared httpx.AsyncClient instance
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+        logger.info("Shared HTTP client created")
+    return _client
+
+
+async def fetch(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: float = HTTP_TIMEOUT,
+    max_bytes: int = MAX_RESPONSE_BYTES
+) -> CappedResponse:
+    """
+    GET a URL with the shared client, reading at most max_bytes of the body.
+    
+    The body is streamed, so an oversized response is abandoned as soon as
+    it crosses the limit instead of being buffered whole.
+    
+    Args:
+        url: URL to request
+        params: Query parameters
+        timeout: Request timeout in seconds
+        max_bytes: Largest body accepted
+        
+    Returns:
+        CappedResponse with the status code and body
+        
+    Raises:
+        ResponseTooLargeError: If the body exceeds max_bytes
+    """
+    client = get_http_client()
+    async with client.stream("GET", url, params=params, timeout=timeout) as response:
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            if len(body) > max_bytes:
+                raise ResponseTooLargeError(f"Response from {url} exceeds {max_bytes} bytes")
+        return CappedResponse(response.status_code, bytes(body))
+
+
+async def close_http_client():
+    """Close the shared HTTP client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Shared HTTP client closed")
+
+# Made with Bob
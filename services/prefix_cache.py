@@ -0,0 +1,143 @@
+"""
+KV cache reuse for shared prompt prefixes.
+
+This module keeps the attention key/value cache of recently seen system
+prompts and conversation prompts, so requests that start with the same system
+turn skip its prefill and a follow-up turn only prefills its new messages.
+"""
+
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple
+
+import torch
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixKVCache:
+    """
+    Bounded LRU mapping of prompt prefix token ids to their KV cache.
+
+    Entries are built and used only from the generation executor thread, which
+    runs one model call at a time; the lock only guards lookups made from the
+    event loop while batches are formed.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.PREFIX_CACHE_ENABLED,
+        max_entries: int = settings.PREFIX_CACHE_MAX_ENTRIES,
+        max_tokens: int = settings.PREFIX_CACHE_MAX_TOKENS
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        # KV memory grows linearly with cached positions, so bound the total
+        self.max_tokens = max_tokens
+        self.entries: "OrderedDict[Tuple[int, ...], object]" = OrderedDict()
+        self._cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def match_length(self, input_ids: Sequence[int]) -> int:
+        """
+        Return the length of the longest cached prefix of a prompt.
+
+        Only proper prefixes count, since generate needs at least one
+        uncached prompt token.
+
+        Args:
+            input_ids: Prompt token ids
+
+        Returns:
+            Number of leading ids with a cached KV cache, or 0
+        """
+        if not self.enabled:
+            return 0
+
+        input_ids = tuple(input_ids)
+        with self._lock:
+            return max(
+                (
+                    len(key) for key in self.entries
+                    if len(key) < len(input_ids) and input_ids[:len(key)] == key
+                ),
+                default=0
+            )
+
+    def get(self, model, prefix_ids: Sequence[int], device: str, batch_size: int = 1) -> Optional[object]:
+        """
+        Return a private copy of the KV cache for a prefix, building it on a miss.
+
+        Args:
+            model: The language model
+            prefix_ids: Token ids of the shared prefix
+            device: Device the model runs on
+            batch_size: Number of rows the returned cache must cover
+
+        Returns:
+            Cache to pass as past_key_values, or None if reuse is disabled
+        """
+        if not self.enabled or not prefix_ids:
+            return None
+
+        key = tuple(prefix_ids)
+        with torch.inference_mode():
+            with self._lock:
+                past_key_values = self.entries.get(key)
+                if past_key_values is not None:
+                    self.entries.move_to_end(key)
+            if past_key_values is None:
+                input_ids = torch.tensor([key], dtype=torch.long, device=device)
+                past_key_values = model(input_ids=input_ids, use_cache=True).past_key_values
+                self._store(key, past_key_values)
+                logger.debug(f"Prefix KV cache built for {len(key)} tokens")
+
+            # generate appends to the cache in place, so hand out a copy
+            past_key_values = copy.deepcopy(past_key_values)
+            if batch_size > 1:
+                past_key_values.batch_repeat_interleave(batch_size)
+
+        return past_key_values
+
+    def put(self, prompt_ids: Sequence[int], past_key_values):
+        """
+        Keep the KV cache of a finished single-row generation for its prompt.
+
+        The cache is cropped in place to the prompt, dropping the generated
+        positions, so a later turn that extends this prompt can reuse it.
+
+        Args:
+            prompt_ids: Token ids of the prompt that was generated from
+            past_key_values: Cache generate filled for that prompt
+        """
+        if not self.enabled or not prompt_ids:
+            return
+
+        past_key_values.crop(len(prompt_ids))
+        self._store(tuple(prompt_ids), past_key_values)
+
+    def _store(self, key: Tuple[int, ...], past_key_values):
+        """Insert an entry and evict the least recently used beyond the limits."""
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self._cached_tokens -= len(key)
+            self.entries[key] = past_key_values
+            self._cached_tokens += len(key)
+            while len(self.entries) > 1 and (
+                len(self.entries) > self.max_entries or self._cached_tokens > self.max_tokens
+            ):
+                evicted, _ = self.entries.popitem(last=False)
+                self._cached_tokens -= len(evicted)
+
+    def clear(self):
+        """Drop all cached prefixes."""
+        with self._lock:
+            self.entries.clear()
+            self._cached_tokens = 0
+
+# Made with Bob
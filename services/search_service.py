@@ -4,14 +4,84 @@ Web search service using DuckDuckGo API.
 This module provides web search functionality using the DuckDuckGo Instant Answer API.
 """
 
+import asyncio
 import logging
+import time
+from collections import OrderedDict
 import httpx
-from typing import Dict, Any
+import orjson
+from typing import Dict, Any, Tuple
+from .http_client import fetch
 
 logger = logging.getLogger(__name__)
 
+# Instant answers barely change over minutes, so repeat queries are served locally
+SEARCH_CACHE_TTL_SECONDS = 600
+SEARCH_CACHE_MAX_ENTRIES = 1024
+
+# (normalized query, max_results) -> (timestamp, result), in LRU order
+_search_cache: "OrderedDict[Tuple[str, int], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+# Searches currently running, so identical concurrent queries share one request
+_search_inflight: Dict[Tuple[str, int], "asyncio.Task[Dict[str, Any]]"] = {}
+
 
 async def search_web(query: str, max_results: int = 5) -> Dict[str, Any]:
+    """
+    Search the web, reusing recent results for the same query.
+    
+    Successful results are cached for SEARCH_CACHE_TTL_SECONDS, and concurrent
+    calls for a query that is already being searched await that search instead
+    of sending their own request.
+    
+    Args:
+        query: The search query string
+        max_results: Maximum number of related topics to return (default: 5)
+        
+    Returns:
+        Dictionary containing search results with abstract, related topics, and sources
+    """
+    key = (query.strip().lower(), max_results)
+    
+    cached = _search_cache.get(key)
+    if cached is not None:
+        timestamp, result = cached
+        if time.monotonic() - timestamp < SEARCH_CACHE_TTL_SECONDS:
+            _search_cache.move_to_end(key)
+            logger.debug(f"Search cache hit for: {query}")
+            return result
+        del _search_cache[key]
+    
+    task = _search_inflight.get(key)
+    if task is None:
+        # The search runs as its own task so a caller that is cancelled (e.g.
+        # its client disconnected) stops only its own wait, not everyone's
+        task = asyncio.create_task(_search_and_cache(key, query, max_results))
+        _search_inflight[key] = task
+        task.add_done_callback(lambda done: _finish_search(key, done))
+    return await asyncio.shield(task)
+
+
+async def _search_and_cache(key: Tuple[str, int], query: str, max_results: int) -> Dict[str, Any]:
+    """Run one search and cache a successful result under `key`"""
+    result = await _fetch_search_results(query, max_results)
+    # Errors are not cached so the next call retries the API
+    if "error" not in result:
+        _search_cache[key] = (time.monotonic(), result)
+        while len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+            _search_cache.popitem(last=False)
+    return result
+
+
+def _finish_search(key: Tuple[str, int], task: "asyncio.Task[Dict[str, Any]]"):
+    """Forget a finished search so the next call starts a new one"""
+    if _search_inflight.get(key) is task:
+        del _search_inflight[key]
+    # Mark a failure retrieved so the loop doesn't log it when every caller had gone
+    if not task.cancelled():
+        task.exception()
+
+
+async def _fetch_search_results(query: str, max_results: int) -> Dict[str, Any]:
     """
     Search the web using DuckDuckGo Instant Answer API.
     
@@ -29,113 +99,110 @@ async def search_web(query: str, max_results: int = 5) -> Dict[str, Any]:
     try:
         logger.info(f"Searching web for: {query}")
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://api.duckduckgo.com/",
-                params={
-                    "q": query,
-                    "format": "json",
-                    "no_html": 1,
-                    "skip_disambig": 1
-                },
-                timeout=10.0,
-                headers={"User-Agent": "GraniteChat/1.0"}
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"DuckDuckGo API error: {response.status_code}")
-                return {
-                    "error": f"Search API returned status {response.status_code}",
-                    "query": query
-                }
-            
-            # Check if response has content
-            response_text = response.text.strip()
-            if not response_text:
-                logger.warning(f"DuckDuckGo API returned empty response for: {query}")
-                return {
-                    "query": query,
-                    "abstract": "",
-                    "summary": f"No instant answer available for '{query}'. The search API returned an empty response. This query may require a more specific search or the information may not be available in the instant answer database."
-                }
-            
-            try:
-                data = response.json()
-            except Exception as json_error:
-                logger.error(f"Failed to parse JSON response: {json_error}")
-                return {
-                    "query": query,
-                    "error": "Failed to parse search results",
-                    "summary": f"Unable to retrieve search results for '{query}'. Please try rephrasing your query."
-                }
-            
-            logger.info(f"DuckDuckGo API response received for query: {query}")
-            
-            # Extract relevant information
-            result = {
+        response = await fetch(
+            "https://api.duckduckgo.com/",
+            params={
+                "q": query,
+                "format": "json",
+                "no_html": 1,
+                "skip_disambig": 1
+            },
+            timeout=10.0
+        )
+        
+        if response.status_code != 200:
+            logger.error(f"DuckDuckGo API error: {response.status_code}")
+            return {
+                "error": f"Search API returned status {response.status_code}",
+                "query": query
+            }
+        
+        # Check if response has content
+        if not response.content.strip():
+            logger.warning(f"DuckDuckGo API returned empty response for: {query}")
+            return {
                 "query": query,
-                "abstract": data.get("Abstract", ""),
-                "abstract_source": data.get("AbstractSource", ""),
-                "abstract_url": data.get("AbstractURL", ""),
-                "answer": data.get("Answer", ""),
-                "heading": data.get("Heading", ""),
-                "entity": data.get("Entity", ""),
-                "related_topics": [],
-                "results": []
+                "abstract": "",
+                "summary": f"No instant answer available for '{query}'. The search API returned an empty response. This query may require a more specific search or the information may not be available in the instant answer database."
             }
+        
+        try:
+            data = orjson.loads(response.content)
+        except Exception as json_error:
+            logger.error(f"Failed to parse JSON response: {json_error}")
+            return {
+                "query": query,
+                "error": "Failed to parse search results",
+                "summary": f"Unable to retrieve search results for '{query}'. Please try rephrasing your query."
+            }
+        
+        logger.info(f"DuckDuckGo API response received for query: {query}")
+        
+        # Extract relevant information
+        result = {
+            "query": query,
+            "abstract": data.get("Abstract", ""),
+            "abstract_source": data.get("AbstractSource", ""),
+            "abstract_url": data.get("AbstractURL", ""),
+            "answer": data.get("Answer", ""),
+            "heading": data.get("Heading", ""),
+            "entity": data.get("Entity", ""),
+            "related_topics": [],
+            "results": []
+        }
+        
+        # Add image if available
+        if data.get("Image"):
+            result["image_url"] = f"https://duckduckgo.com{data['Image']}"
+        
+        # Add official website if available
+        if data.get("OfficialWebsite"):
+            result["official_website"] = data["OfficialWebsite"]
+        
+        # Extract related topics (limit to max_results)
+        related_topics = data.get("RelatedTopics", [])
+        for topic in related_topics[:max_results]:
+            if isinstance(topic, dict) and "Text" in topic:
+                result["related_topics"].append({
+                    "text": topic.get("Text", ""),
+                    "url": topic.get("FirstURL", "")
+                })
+        
+        # Extract instant answer results
+        results = data.get("Results", [])
+        for res in results[:max_results]:
+            if isinstance(res, dict):
+                result["results"].append({
+                    "text": res.get("Text", ""),
+                    "url": res.get("FirstURL", "")
+                })
+        
+        # Create a summary description
+        if result["abstract"]:
+            summary = [f"Search results for '{query}':\n\n", f"{result['abstract']}\n\n"]
+            if result["abstract_source"]:
+                summary.append(f"Source: {result['abstract_source']}")
+                if result["abstract_url"]:
+                    summary.append(f" ({result['abstract_url']})")
+                summary.append("\n\n")
             
-            # Add image if available
-            if data.get("Image"):
-                result["image_url"] = f"https://duckduckgo.com{data['Image']}"
-            
-            # Add official website if available
-            if data.get("OfficialWebsite"):
-                result["official_website"] = data["OfficialWebsite"]
-            
-            # Extract related topics (limit to max_results)
-            related_topics = data.get("RelatedTopics", [])
-            for topic in related_topics[:max_results]:
-                if isinstance(topic, dict) and "Text" in topic:
-                    result["related_topics"].append({
-                        "text": topic.get("Text", ""),
-                        "url": topic.get("FirstURL", "")
-                    })
-            
-            # Extract instant answer results
-            results = data.get("Results", [])
-            for res in results[:max_results]:
-                if isinstance(res, dict):
-                    result["results"].append({
-                        "text": res.get("Text", ""),
-                        "url": res.get("FirstURL", "")
-                    })
-            
-            # Create a summary description
-            if result["abstract"]:
-                summary = f"Search results for '{query}':\n\n"
-                summary += f"{result['abstract']}\n\n"
-                if result["abstract_source"]:
-                    summary += f"Source: {result['abstract_source']}"
-                    if result["abstract_url"]:
-                        summary += f" ({result['abstract_url']})"
-                    summary += "\n\n"
-                
-                if result.get("official_website"):
-                    summary += f"Official Website: {result['official_website']}\n\n"
-                
-                if result["related_topics"]:
-                    summary += "Related Topics:\n"
-                    for i, topic in enumerate(result["related_topics"], 1):
-                        summary += f"{i}. {topic['text']}\n"
-                
-                result["summary"] = summary
-            elif result["answer"]:
-                result["summary"] = f"Answer for '{query}': {result['answer']}"
-            else:
-                result["summary"] = f"No detailed information found for '{query}'. Try rephrasing your search query."
+            if result.get("official_website"):
+                summary.append(f"Official Website: {result['official_website']}\n\n")
             
-            return result
+            if result["related_topics"]:
+                summary.append("Related Topics:\n")
+                summary.extend(
+                    f"{i}. {topic['text']}\n" for i, topic in enumerate(result["related_topics"], 1)
+                )
             
+            result["summary"] = "".join(summary)
+        elif result["answer"]:
+            result["summary"] = f"Answer for '{query}': {result['answer']}"
+        else:
+            result["summary"] = f"No detailed information found for '{query}'. Try rephrasing your search query."
+        
+        return result
+        
     except httpx.TimeoutException:
         logger.error(f"DuckDuckGo API timeout for query: {query}")
         return {"error": "Search API request timed out", "query": query}
@@ -0,0 +1,171 @@
+"""
+Semantic response cache.
+
+This module short-circuits generation for prompts that are near-duplicates
+of recently answered ones, using embedding similarity search.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Number of nearest neighbours inspected per lookup
+SEARCH_K = 8
+
+
+def _params_key(scope: str, generation_params: Dict[str, Any]) -> tuple:
+    """Build a key so cached responses are only reused with identical settings."""
+    return (scope, tuple(sorted(generation_params.items())))
+
+
+class SemanticCache:
+    """
+    Embedding-keyed response cache with LRU eviction and a TTL.
+
+    Prompts are embedded with a small sentence-transformers model and stored
+    in a FAISS inner-product index over L2-normalized vectors, so the search
+    score is the cosine similarity to previously answered prompts.
+    """
+
+    def __init__(
+        self,
+        model_name: str = settings.SEMANTIC_CACHE_MODEL,
+        threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = settings.SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = settings.SEMANTIC_CACHE_TTL_SECONDS
+    ):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.encoder = None
+        self.index = None
+        self.entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the embedding model and create an empty index."""
+        try:
+            import faiss
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            logger.warning(f"Semantic cache disabled, missing dependency: {str(e)}")
+            return
+
+        self.encoder = SentenceTransformer(self.model_name)
+        dimension = self.encoder.get_sentence_embedding_dimension()
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        logger.info(
+            f"Semantic cache initialized: {self.model_name}, "
+            f"threshold={self.threshold}, TTL={self.ttl_seconds}s"
+        )
+
+    def is_loaded(self) -> bool:
+        """Check if the embedding model and index are ready."""
+        return self.encoder is not None and self.index is not None
+
+    async def embed(self, prompt: str) -> Optional[np.ndarray]:
+        """
+        Embed a prompt for lookup and storage.
+
+        Args:
+            prompt: Formatted prompt text
+
+        Returns:
+            Normalized embedding row, or None if the cache is disabled
+        """
+        if not self.is_loaded():
+            return None
+
+        loop = asyncio.get_event_loop()
+        embedding = await loop.run_in_executor(
+            None,
+            lambda: self.encoder.encode([prompt], normalize_embeddings=True)
+        )
+        return np.asarray(embedding, dtype="float32")
+
+    def get(self, query: Optional[np.ndarray], scope: str, generation_params: Dict[str, Any]) -> Optional[Any]:
+        """
+        Return the cached response for the most similar prompt, if any.
+
+        Args:
+            query: Embedding returned by embed()
+            scope: Endpoint name the response belongs to
+            generation_params: Generation parameters of the request
+
+        Returns:
+            Cached response, or None on a miss
+        """
+        if query is None:
+            return None
+
+        key = _params_key(scope, generation_params)
+        with self._lock:
+            self._evict_expired()
+            if not self.entries:
+                return None
+
+            scores, ids = self.index.search(query, min(SEARCH_K, len(self.entries)))
+            for score, entry_id in zip(scores[0], ids[0]):
+                if score < self.threshold:
+                    break
+                entry = self.entries.get(int(entry_id))
+                if entry is not None and entry["key"] == key:
+                    self.entries.move_to_end(int(entry_id))
+                    logger.debug(f"Semantic cache hit (similarity={score:.3f})")
+                    return entry["value"]
+
+        return None
+
+    def set(self, query: Optional[np.ndarray], scope: str, generation_params: Dict[str, Any], value: Any):
+        """
+        Store a generated response.
+
+        Args:
+            query: Embedding returned by embed()
+            scope: Endpoint name the response belongs to
+            generation_params: Generation parameters of the request
+            value: Response to cache
+        """
+        if query is None:
+            return
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(query, np.array([entry_id], dtype="int64"))
+            self.entries[entry_id] = {
+                "key": _params_key(scope, generation_params),
+                "value": value,
+                "timestamp": time.time()
+            }
+
+            # Evict least recently used entries beyond capacity
+            while len(self.entries) > self.max_entries:
+                oldest_id, _ = self.entries.popitem(last=False)
+                self.index.remove_ids(np.array([oldest_id], dtype="int64"))
+
+    def _evict_expired(self):
+        """Drop entries older than the TTL (caller holds the lock)."""
+        cutoff = time.time() - self.ttl_seconds
+        expired = [entry_id for entry_id, entry in self.entries.items() if entry["timestamp"] < cutoff]
+        if expired:
+            for entry_id in expired:
+                del self.entries[entry_id]
+            self.index.remove_ids(np.array(expired, dtype="int64"))
+
+
+# Global semantic cache instance
+semantic_cache = SemanticCache()
+
+# Made with Bob
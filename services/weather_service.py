@@ -6,18 +6,139 @@ with geocoding support via OpenStreetMap Nominatim.
 """
 
 import logging
+import os
+import re
+import unicodedata
+from functools import lru_cache
+import diskcache
 import httpx
-from typing import Dict, Any, Optional
-from constants import CITY_COORDINATES
+import numpy as np
+import orjson
+from typing import Dict, Any, List, Optional
+from constants import CITY_COORDINATES, WEATHER_CONDITIONS
 from core.config import settings
+from .http_client import fetch
 
 logger = logging.getLogger(__name__)
 
+# Geocoding results are persisted across restarts; coordinates rarely change
+GEOCODE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+_geocode_cache: Optional[diskcache.Cache] = None
+
+
+def _get_geocode_cache() -> diskcache.Cache:
+    """Get the on-disk geocoding cache, opening it on first use."""
+    global _geocode_cache
+    if _geocode_cache is None:
+        _geocode_cache = diskcache.Cache(os.path.join(settings.CACHE_DIR, "geocode"))
+    return _geocode_cache
+
+
+@lru_cache(maxsize=2048)
+def _normalize_location(location: str) -> str:
+    """Fold case, accents and whitespace so "São Paulo" and "sao  paulo" share a key."""
+    decomposed = unicodedata.normalize("NFKD", location)
+    folded = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(folded.casefold().split())
+
+
+# Pictocode -> condition name table; Meteoblue pictocodes are small integers
+_CONDITION_LUT = tuple(WEATHER_CONDITIONS.get(code, "Clear") for code in range(64))
+
+
+def _condition_name(pictocode: int) -> str:
+    """Return the condition name for a Meteoblue pictocode."""
+    return _CONDITION_LUT[pictocode] if 0 <= pictocode < len(_CONDITION_LUT) else "Clear"
+
+
+# Predefined coordinates keyed by normalized name, built once at import
+_CITY_LOOKUP: Dict[str, Dict[str, Any]] = {
+    _normalize_location(name): coords for name, coords in CITY_COORDINATES.items()
+}
+
+# Matches any predefined city as a whole word inside a longer location string
+_CITY_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(name) for name in sorted(_CITY_LOOKUP, key=len, reverse=True)) + r")\b"
+)
+
+
+def _find_known_city(normalized_location: str) -> Optional[Dict[str, Any]]:
+    """Return the coordinates of the longest predefined city mentioned in a location."""
+    matches = [match.group() for match in _CITY_PATTERN.finditer(normalized_location)]
+    if not matches:
+        return None
+    return _CITY_LOOKUP[max(matches, key=len)]
+
+
+def _hourly_values(hourly_data: Dict[str, Any], key: str, default, num_hours: int) -> np.ndarray:
+    """Return an hourly series as a float array, filled with a default if missing."""
+    values = hourly_data.get(key)
+    if values is None:
+        return np.broadcast_to(np.asarray(default, dtype=np.float64), (num_hours,))
+    return np.asarray(values, dtype=np.float64)
+
+
+def _build_hourly_forecast(hourly_data: Dict[str, Any], units: str) -> List[Dict[str, Any]]:
+    """
+    Convert Meteoblue hourly series into per-hour forecast entries.
+    
+    Unit conversion and rounding run once over whole arrays, and the rounded
+    series are converted back to Python numbers with tolist() before being
+    zipped into one dictionary per hour.
+    
+    Args:
+        hourly_data: The data_1h section of the Meteoblue response
+        units: Temperature units (celsius or fahrenheit)
+        
+    Returns:
+        List of hourly forecast dictionaries
+    """
+    return _expand(_hourly_columns(hourly_data, units))
+
+
+def _expand(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Turn equal-length columns into one dictionary per row."""
+    fields = list(columns)
+    return [dict(zip(fields, row)) for row in zip(*columns.values())]
+
+
+def _hourly_columns(hourly_data: Dict[str, Any], units: str) -> Dict[str, List[Any]]:
+    """Compute every hourly forecast field as one list indexed by hour."""
+    times = list(hourly_data.get("time", []))
+    num_hours = len(times)
+    if num_hours == 0:
+        return {"time": []}
+    
+    temperature = _hourly_values(hourly_data, "temperature", 0, num_hours)
+    feels_like = _hourly_values(hourly_data, "felttemperature", temperature, num_hours)
+    if units != "celsius":
+        temperature = temperature * 1.8 + 32
+        feels_like = feels_like * 1.8 + 32
+    
+    pictocodes = _hourly_values(hourly_data, "pictocode", 1, num_hours).astype(np.int64).tolist()
+    
+    return {
+        "time": times,
+        "temperature": np.round(temperature, 1).tolist(),
+        "feels_like": np.round(feels_like, 1).tolist(),
+        "condition": [_condition_name(code) for code in pictocodes],
+        "humidity": np.rint(_hourly_values(hourly_data, "relativehumidity", 50, num_hours)).astype(np.int64).tolist(),
+        "wind_speed": np.round(_hourly_values(hourly_data, "windspeed", 0, num_hours), 1).tolist(),
+        "wind_direction": np.rint(_hourly_values(hourly_data, "winddirection", 0, num_hours)).astype(np.int64).tolist(),
+        "precipitation": np.round(_hourly_values(hourly_data, "precipitation", 0, num_hours), 1).tolist(),
+        "precipitation_probability": np.rint(
+            _hourly_values(hourly_data, "precipitation_probability", 0, num_hours)
+        ).astype(np.int64).tolist(),
+        "uv_index": np.rint(_hourly_values(hourly_data, "uvindex", 0, num_hours)).astype(np.int64).tolist()
+    }
+
 
 async def geocode_location(location: str) -> Dict[str, Any]:
     """
     Convert location name to coordinates using OpenStreetMap Nominatim API.
-    Falls back to predefined coordinates for common cities.
+    Checks predefined coordinates for common cities and the on-disk cache of
+    earlier lookups before calling the API.
     
     Args:
         location: City name or location
@@ -25,34 +146,41 @@ async def geocode_location(location: str) -> Dict[str, Any]:
     Returns:
         Dictionary with lat, lon, and name
     """
-    # Check predefined coordinates first
-    location_lower = location.lower().strip()
-    if location_lower in CITY_COORDINATES:
-        return CITY_COORDINATES[location_lower]
+    # Check predefined coordinates first, then predefined cities mentioned in the text
+    cache_key = _normalize_location(location)
+    coords = _CITY_LOOKUP.get(cache_key) or _find_known_city(cache_key)
+    if coords is not None:
+        return coords
+    
+    # Then previously geocoded locations
+    cache = _get_geocode_cache()
+    coords = cache.get(cache_key)
+    if coords is not None:
+        return coords
     
     # Try OpenStreetMap Nominatim API for geocoding
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={
-                    "q": location,
-                    "format": "json",
-                    "limit": 1
-                },
-                headers={"User-Agent": "GraniteChat/1.0"},
-                timeout=5.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data and len(data) > 0:
-                    result = data[0]
-                    return {
-                        "lat": float(result["lat"]),
-                        "lon": float(result["lon"]),
-                        "name": result.get("display_name", location)
-                    }
+        response = await fetch(
+            "https://nominatim.openstreetmap.org/search",
+            params={
+                "q": location,
+                "format": "json",
+                "limit": 1
+            },
+            timeout=5.0
+        )
+        
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            if data and len(data) > 0:
+                result = data[0]
+                coords = {
+                    "lat": float(result["lat"]),
+                    "lon": float(result["lon"]),
+                    "name": result.get("display_name", location)
+                }
+                cache.set(cache_key, coords, expire=GEOCODE_CACHE_TTL_SECONDS)
+                return coords
     except Exception as e:
         logger.warning(f"Geocoding failed for {location}: {str(e)}")
     
@@ -103,114 +231,87 @@ async def get_weather(location: str, units: str = "celsius", api_key: Optional[s
         logger.info(f"Geocoded {location} to lat={coords['lat']}, lon={coords['lon']}")
         
         # Call Meteoblue Forecast API with coordinates
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://my.meteoblue.com/packages/basic-1h",
-                params={
-                    "lat": coords["lat"],
-                    "lon": coords["lon"],
-                    "apikey": api_key,
-                    "format": "json"
-                },
-                timeout=10.0
-            )
+        response = await fetch(
+            "https://my.meteoblue.com/packages/basic-1h",
+            params={
+                "lat": coords["lat"],
+                "lon": coords["lon"],
+                "apikey": api_key,
+                "format": "json"
+            },
+            timeout=10.0
+        )
+        
+        if response.status_code != 200:
+            logger.error(f"Meteoblue API error: {response.status_code} - {response.content.decode(errors='replace')}")
+            return {
+                "error": f"Weather API returned status {response.status_code}",
+                "location": location
+            }
+        
+        data = orjson.loads(response.content)
+        logger.info(f"Meteoblue API response keys: {data.keys()}")
+        
+        # Extract current weather data from the first hour of forecast
+        if "data_1h" in data:
+            hourly_data = data["data_1h"]
+            metadata = data.get("metadata", {})
             
-            if response.status_code != 200:
-                logger.error(f"Meteoblue API error: {response.status_code} - {response.text}")
-                return {
-                    "error": f"Weather API returned status {response.status_code}",
-                    "location": location
-                }
+            # Get the first (current) hour data
+            temp_c = hourly_data["temperature"][0] if "temperature" in hourly_data else 20
+            windspeed = hourly_data["windspeed"][0] if "windspeed" in hourly_data else 10
+            precipitation = hourly_data["precipitation"][0] if "precipitation" in hourly_data else 0
+            humidity = hourly_data.get("relativehumidity", [50])[0]
+            felt_temp_c = hourly_data.get("felttemperature", [temp_c])[0]
+            wind_direction = hourly_data.get("winddirection", [0])[0]
+            pictocode = hourly_data.get("pictocode", [1])[0]
+            uv_index = hourly_data.get("uvindex", [0])[0]
+            precipitation_prob = hourly_data.get("precipitation_probability", [0])[0]
             
-            data = response.json()
-            logger.info(f"Meteoblue API response keys: {data.keys()}")
+            # Convert to Fahrenheit if needed
+            temp_f = (temp_c * 9/5) + 32
+            felt_temp_f = (felt_temp_c * 9/5) + 32
             
-            # Extract current weather data from the first hour of forecast
-            if "data_1h" in data:
-                hourly_data = data["data_1h"]
-                metadata = data.get("metadata", {})
-                
-                # Get the first (current) hour data
-                temp_c = hourly_data["temperature"][0] if "temperature" in hourly_data else 20
-                windspeed = hourly_data["windspeed"][0] if "windspeed" in hourly_data else 10
-                precipitation = hourly_data["precipitation"][0] if "precipitation" in hourly_data else 0
-                humidity = hourly_data.get("relativehumidity", [50])[0]
-                felt_temp_c = hourly_data.get("felttemperature", [temp_c])[0]
-                wind_direction = hourly_data.get("winddirection", [0])[0]
-                pictocode = hourly_data.get("pictocode", [1])[0]
-                uv_index = hourly_data.get("uvindex", [0])[0]
-                precipitation_prob = hourly_data.get("precipitation_probability", [0])[0]
-                
-                # Convert to Fahrenheit if needed
-                temp_f = (temp_c * 9/5) + 32
-                felt_temp_f = (felt_temp_c * 9/5) + 32
-                
-                # Determine condition based on pictocode
-                condition_map = {
-                    1: "Clear", 2: "Partly Cloudy", 3: "Cloudy", 4: "Overcast",
-                    5: "Fog", 6: "Light Rain", 7: "Rain", 8: "Heavy Rain",
-                    9: "Thunderstorm", 12: "Light Snow", 13: "Snow", 14: "Heavy Snow",
-                    20: "Drizzle", 21: "Light Showers", 22: "Showers", 23: "Heavy Showers",
-                    27: "Light Snow Showers", 28: "Snow Showers", 31: "Thunderstorm with Rain",
-                    33: "Thunderstorm with Snow"
-                }
-                condition = condition_map.get(pictocode, "Clear")
-                
-                location_name = metadata.get("name") or coords.get("name", location)
-                
-                # Build hourly forecast array
-                hourly_forecast = []
-                num_hours = len(hourly_data.get("time", []))
-                
-                for i in range(num_hours):
-                    hour_temp_c = hourly_data["temperature"][i]
-                    hour_temp_f = (hour_temp_c * 9/5) + 32
-                    
-                    hourly_forecast.append({
-                        "time": hourly_data["time"][i],
-                        "temperature": round(hour_temp_c if units == "celsius" else hour_temp_f, 1),
-                        "feels_like": round(hourly_data.get("felttemperature", [hour_temp_c]*num_hours)[i] if units == "celsius" else (hourly_data.get("felttemperature", [hour_temp_c]*num_hours)[i] * 9/5) + 32, 1),
-                        "condition": condition_map.get(hourly_data.get("pictocode", [1]*num_hours)[i], "Clear"),
-                        "humidity": round(hourly_data.get("relativehumidity", [50]*num_hours)[i]),
-                        "wind_speed": round(hourly_data.get("windspeed", [0]*num_hours)[i], 1),
-                        "wind_direction": round(hourly_data.get("winddirection", [0]*num_hours)[i]),
-                        "precipitation": round(hourly_data.get("precipitation", [0]*num_hours)[i], 1),
-                        "precipitation_probability": round(hourly_data.get("precipitation_probability", [0]*num_hours)[i]),
-                        "uv_index": round(hourly_data.get("uvindex", [0]*num_hours)[i])
-                    })
-                
-                weather_data = {
-                    "location": location_name,
-                    "coordinates": {
-                        "latitude": metadata.get("latitude", coords.get("lat")),
-                        "longitude": metadata.get("longitude", coords.get("lon")),
-                        "elevation": metadata.get("height"),
-                        "timezone": metadata.get("timezone_abbrevation", "UTC")
-                    },
-                    "current": {
-                        "temperature": round(temp_c if units == "celsius" else temp_f, 1),
-                        "feels_like": round(felt_temp_c if units == "celsius" else felt_temp_f, 1),
-                        "unit": unit_symbol,
-                        "condition": condition,
-                        "humidity": round(humidity),
-                        "wind_speed": round(windspeed, 1),
-                        "wind_direction": round(wind_direction),
-                        "precipitation": round(precipitation, 1),
-                        "precipitation_probability": round(precipitation_prob),
-                        "uv_index": round(uv_index)
-                    },
-                    "hourly_forecast": hourly_forecast,
-                    "summary": f"Weather forecast for {location_name}: Currently {condition.lower()} with {round(temp_c if units == 'celsius' else temp_f, 1)}{unit_symbol} (feels like {round(felt_temp_c if units == 'celsius' else felt_temp_f, 1)}{unit_symbol}). {len(hourly_forecast)} hours of forecast data available."
-                }
-                
-                return weather_data
-            else:
-                logger.error(f"No data_1h in response. Available keys: {data.keys()}")
-                return {
-                    "error": "Unable to parse weather data from API response",
-                    "location": location
-                }
+            # Determine condition based on pictocode
+            condition = _condition_name(int(pictocode))
+            
+            location_name = metadata.get("name") or coords.get("name", location)
+            
+            # Build hourly forecast array
+            hourly_forecast = _build_hourly_forecast(hourly_data, units)
             
+            weather_data = {
+                "location": location_name,
+                "coordinates": {
+                    "latitude": metadata.get("latitude", coords.get("lat")),
+                    "longitude": metadata.get("longitude", coords.get("lon")),
+                    "elevation": metadata.get("height"),
+                    "timezone": metadata.get("timezone_abbrevation", "UTC")
+                },
+                "current": {
+                    "temperature": round(temp_c if units == "celsius" else temp_f, 1),
+                    "feels_like": round(felt_temp_c if units == "celsius" else felt_temp_f, 1),
+                    "unit": unit_symbol,
+                    "condition": condition,
+                    "humidity": round(humidity),
+                    "wind_speed": round(windspeed, 1),
+                    "wind_direction": round(wind_direction),
+                    "precipitation": round(precipitation, 1),
+                    "precipitation_probability": round(precipitation_prob),
+                    "uv_index": round(uv_index)
+                },
+                "hourly_forecast": hourly_forecast,
+                "summary": f"Weather forecast for {location_name}: Currently {condition.lower()} with {round(temp_c if units == 'celsius' else temp_f, 1)}{unit_symbol} (feels like {round(felt_temp_c if units == 'celsius' else felt_temp_f, 1)}{unit_symbol}). {len(hourly_forecast)} hours of forecast data available."
+            }
+            
+            return weather_data
+        else:
+            logger.error(f"No data_1h in response. Available keys: {data.keys()}")
+            return {
+                "error": "Unable to parse weather data from API response",
+                "location": location
+            }
+        
     except httpx.TimeoutException:
         logger.error(f"Meteoblue API timeout for {location}")
         return {"error": "Weather API request timed out", "location": location}
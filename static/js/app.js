@@ -232,103 +232,37 @@ function updateMessageUI(messageTextElement, responseText) {
     messagesContainer.scrollTop = messagesContainer.scrollHeight;
 }
 
-// Parse stream buffer and extract tokens from JSON chunks
-function parseStreamBuffer(buffer, isFirstChunk) {
+// Parse stream buffer and extract tokens from server-sent events
+function parseStreamBuffer(buffer) {
     const tokens = [];
     let updatedBuffer = buffer;
-    let stillFirstChunk = isFirstChunk;
     
-    try {
-        // Handle first chunk - remove JSON opening and find the choices array
-        if (stillFirstChunk && updatedBuffer.includes('{"id":') && updatedBuffer.includes('"choices": [')) {
-            stillFirstChunk = false;
-            const choicesStart = updatedBuffer.indexOf('"choices": [') + '"choices": ['.length;
-            updatedBuffer = updatedBuffer.substring(choicesStart);
+    // Every complete event ends with a blank line; keep a partial event for the next read
+    let eventEnd;
+    while ((eventEnd = updatedBuffer.indexOf('\n\n')) !== -1) {
+        const event = updatedBuffer.substring(0, eventEnd);
+        updatedBuffer = updatedBuffer.substring(eventEnd + 2);
+        
+        if (!event.startsWith('data: ')) {
+            continue;
         }
         
-        // Process complete JSON objects in the buffer
-        // We need to find complete JSON objects by counting braces
-        while (updatedBuffer.length > 0) {
-            // Skip leading whitespace and commas
-            updatedBuffer = updatedBuffer.trimStart();
-            if (updatedBuffer.startsWith(',')) {
-                updatedBuffer = updatedBuffer.substring(1).trimStart();
-            }
-            
-            // Check if we're at the end of the choices array
-            if (updatedBuffer.startsWith(']')) {
-                // Stream is complete
-                break;
-            }
-            
-            // Find the start of a JSON object
-            if (!updatedBuffer.startsWith('{')) {
-                // No JSON object starts here, wait for more data
-                break;
-            }
-            
-            // Find the matching closing brace
-            let braceCount = 0;
-            let endPos = -1;
-            let inString = false;
-            let escapeNext = false;
-            
-            for (let i = 0; i < updatedBuffer.length; i++) {
-                const char = updatedBuffer[i];
-                
-                if (escapeNext) {
-                    escapeNext = false;
-                    continue;
-                }
-                
-                if (char === '\\') {
-                    escapeNext = true;
-                    continue;
-                }
-                
-                if (char === '"') {
-                    inString = !inString;
-                    continue;
-                }
-                
-                if (!inString) {
-                    if (char === '{') {
-                        braceCount++;
-                    } else if (char === '}') {
-                        braceCount--;
-                        if (braceCount === 0) {
-                            endPos = i + 1;
-                            break;
-                        }
-                    }
-                }
-            }
-            
-            // If we didn't find a complete JSON object, wait for more data
-            if (endPos === -1) {
-                break;
-            }
-            
-            // Extract and parse the JSON object
-            const jsonStr = updatedBuffer.substring(0, endPos);
-            
-            try {
-                const data = JSON.parse(jsonStr);
-                if (data.delta?.content) {
-                    tokens.push(data.delta.content);
-                }
-            } catch (e) {
-                console.log('Error parsing JSON:', e.message, 'JSON:', jsonStr.substring(0, 100));
+        const payload = event.substring('data: '.length);
+        if (payload === '[DONE]') {
+            continue;
+        }
+        
+        try {
+            const data = JSON.parse(payload);
+            if (data.delta?.content) {
+                tokens.push(data.delta.content);
             }
-            
-            // Remove processed part from buffer
-            updatedBuffer = updatedBuffer.substring(endPos);
+        } catch (e) {
+            console.log('Error parsing JSON:', e.message, 'JSON:', payload.substring(0, 100));
         }
-    } catch (e) {
-        console.log('Error in parseStreamBuffer:', e);
     }
     
-    return { updatedBuffer, tokens, isFirstChunk: stillFirstChunk };
+    return { updatedBuffer, tokens };
 }
 
 // Helper function to detect function calls in text
@@ -409,7 +343,6 @@ async function processStreamChunks(readableStream, messageTextElement) {
     const decoder = new TextDecoder();
     let buffer = '';
     let responseText = '';
-    let isFirstChunk = true;
     let pendingTokens = [];
     let isAnimating = false;
     let reasoningIndicator = null;
@@ -439,13 +372,12 @@ async function processStreamChunks(readableStream, messageTextElement) {
             const { done, value } = await reader.read();
             if (done) break;
             
-            // Decode chunk and add to buffer
-            buffer += decoder.decode(value);
+            // Decode chunk and add to buffer (stream mode keeps split UTF-8 sequences intact)
+            buffer += decoder.decode(value, { stream: true });
             
             // Parse buffer and extract tokens
-            const result = parseStreamBuffer(buffer, isFirstChunk);
+            const result = parseStreamBuffer(buffer);
             buffer = result.updatedBuffer;
-            isFirstChunk = result.isFirstChunk;
             
             // Add tokens to pending queue
             if (result.tokens.length > 0) {
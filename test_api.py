@@ -1,23 +1,97 @@
-import requests
+import asyncio
+import base64
+import codecs
+import hashlib
+import httpx
 import json
+import os
 import time
 import argparse
 
-def test_health(base_url):
+# Where --mode record saves responses and --mode replay reads them
+DEFAULT_FIXTURES = "fixtures/api_responses.json"
+
+# Bound every phase of a request so a hung server fails the run instead of freezing it;
+# reads get the longest budget because generation happens before the first byte
+TIMEOUT = httpx.Timeout(connect=5, read=60, write=10, pool=5)
+LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=20)
+
+# Connection failures are retried by the transport; 5xx responses by post_with_retry
+TRANSPORT_RETRIES = 2
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 4.0
+
+def create_transport():
+    """Pooled HTTP/2 transport that retries failed connection attempts"""
+    return httpx.AsyncHTTPTransport(retries=TRANSPORT_RETRIES, http2=True, limits=LIMITS)
+
+async def post_with_retry(client, url, **kwargs):
+    """POST, retrying 5xx responses (e.g. while the model warms up) with exponential backoff"""
+    for attempt in range(MAX_ATTEMPTS):
+        response = await client.post(url, **kwargs)
+        if response.status_code < 500 or attempt == MAX_ATTEMPTS - 1:
+            return response
+        await asyncio.sleep(min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+
+def request_key(request):
+    """Identify a request by method, path and body"""
+    digest = hashlib.sha256(request.content).hexdigest()
+    return f"{request.method} {request.url.path} {digest}"
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forward requests to the live API and keep a copy of every response"""
+    
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.transport = create_transport()
+        
+    async def handle_async_request(self, request):
+        response = await self.transport.handle_async_request(request)
+        # Keep the raw body so its content encoding still matches the headers
+        body = b"".join([chunk async for chunk in response.aiter_raw()])
+        await response.aclose()
+        self.fixtures[request_key(request)] = {
+            "status_code": response.status_code,
+            "headers": response.headers.multi_items(),
+            "body": base64.b64encode(body).decode("ascii")
+        }
+        return httpx.Response(response.status_code, headers=response.headers, content=body)
+        
+    async def aclose(self):
+        await self.transport.aclose()
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Answer requests from recorded responses without contacting the API"""
+    
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        
+    async def handle_async_request(self, request):
+        recorded = self.fixtures.get(request_key(request))
+        if recorded is None:
+            raise httpx.TransportError(f"No recorded response for {request.method} {request.url.path}")
+        return httpx.Response(
+            recorded["status_code"],
+            headers=recorded["headers"],
+            content=base64.b64decode(recorded["body"])
+        )
+
+async def test_health(client, log):
     """Test the health check endpoint"""
-    print("\n=== Testing Health Check Endpoint ===")
+    log.append("\n=== Testing Health Check Endpoint ===")
     try:
-        response = requests.get(f"{base_url}/health")
-        print(f"Status Code: {response.status_code}")
-        print(f"Response: {response.json()}")
+        response = await client.get("/health")
+        log.append(f"Status Code: {response.status_code}")
+        log.append(f"Response: {response.json()}")
         return response.status_code == 200
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log.append(f"Error: {str(e)}")
         return False
 
-def test_generate(base_url):
+async def test_generate(client, log):
     """Test the text generation endpoint"""
-    print("\n=== Testing Text Generation Endpoint ===")
+    log.append("\n=== Testing Text Generation Endpoint ===")
     payload = {
         "prompt": "Do you know who you are?",
         "max_tokens": 100,
@@ -28,28 +102,28 @@ def test_generate(base_url):
     }
     
     try:
-        start_time = time.time()
-        response = requests.post(f"{base_url}/generate", json=payload)
-        elapsed = time.time() - start_time
+        start_time = time.perf_counter()
+        response = await post_with_retry(client, "/generate", json=payload)
+        elapsed = time.perf_counter() - start_time
         
-        print(f"Status Code: {response.status_code}")
-        print(f"Time taken: {elapsed:.2f} seconds")
+        log.append(f"Status Code: {response.status_code}")
+        log.append(f"Time taken: {elapsed:.2f} seconds")
         
         if response.status_code == 200:
             result = response.json()
-            print(f"Generated Text: {result['generated_text']}")
-            print(f"Execution Time: {result['execution_time']:.2f} seconds")
+            log.append(f"Generated Text: {result['generated_text']}")
+            log.append(f"Execution Time: {result['execution_time']:.2f} seconds")
             return True
         else:
-            print(f"Error: {response.text}")
+            log.append(f"Error: {response.text}")
             return False
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log.append(f"Error: {str(e)}")
         return False
 
-def test_chat_completion(base_url):
+async def test_chat_completion(client, log):
     """Test the OpenAI-compatible chat completion endpoint"""
-    print("\n=== Testing Chat Completion Endpoint ===")
+    log.append("\n=== Testing Chat Completion Endpoint ===")
     payload = {
         "messages": [
             {"role": "system", "content": "You are a helpful assistant."},
@@ -61,27 +135,27 @@ def test_chat_completion(base_url):
     }
     
     try:
-        start_time = time.time()
-        response = requests.post(f"{base_url}/v1/chat/completions", json=payload)
-        elapsed = time.time() - start_time
+        start_time = time.perf_counter()
+        response = await post_with_retry(client, "/v1/chat/completions", json=payload)
+        elapsed = time.perf_counter() - start_time
         
-        print(f"Status Code: {response.status_code}")
-        print(f"Time taken: {elapsed:.2f} seconds")
+        log.append(f"Status Code: {response.status_code}")
+        log.append(f"Time taken: {elapsed:.2f} seconds")
         
         if response.status_code == 200:
             result = response.json()
-            print(f"Generated Text: {result['choices'][0]['message']['content']}")
+            log.append(f"Generated Text: {result['choices'][0]['message']['content']}")
             return True
         else:
-            print(f"Error: {response.text}")
+            log.append(f"Error: {response.text}")
             return False
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log.append(f"Error: {str(e)}")
         return False
 
-def test_function_call(base_url):
+async def test_function_call(client, log):
     """Test the function calling endpoint"""
-    print("\n=== Testing Function Call Endpoint ===")
+    log.append("\n=== Testing Function Call Endpoint ===")
     payload = {
         "messages": [
             {"role": "user", "content": "What's the weather like in Boston right now?"}
@@ -115,44 +189,44 @@ def test_function_call(base_url):
     }
     
     try:
-        start_time = time.time()
-        response = requests.post(f"{base_url}/v1/function_call", json=payload)
-        elapsed = time.time() - start_time
+        start_time = time.perf_counter()
+        response = await post_with_retry(client, "/v1/function_call", json=payload)
+        elapsed = time.perf_counter() - start_time
         
-        print(f"Status Code: {response.status_code}")
-        print(f"Time taken: {elapsed:.2f} seconds")
+        log.append(f"Status Code: {response.status_code}")
+        log.append(f"Time taken: {elapsed:.2f} seconds")
         
         if response.status_code == 200:
             result = response.json()
-            print(f"Generated Text: {result['choices'][0]['message']['content']}")
+            log.append(f"Generated Text: {result['choices'][0]['message']['content']}")
             return True
         else:
-            print(f"Error: {response.text}")
+            log.append(f"Error: {response.text}")
             return False
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log.append(f"Error: {str(e)}")
         return False
 
-def test_execute_function(base_url):
+async def test_execute_function(client, log):
     """Test the function execution endpoint"""
-    print("\n=== Testing Function Execution Endpoint ===")
+    log.append("\n=== Testing Function Execution Endpoint ===")
     
     # First, get available functions
-    print("\n1. Getting available functions...")
+    log.append("\n1. Getting available functions...")
     try:
-        response = requests.get(f"{base_url}/api/functions")
+        response = await client.get("/api/functions")
         if response.status_code == 200:
             functions_data = response.json()
-            print(f"Available functions: {len(functions_data['functions'])}")
+            log.append(f"Available functions: {len(functions_data['functions'])}")
             for func in functions_data['functions']:
-                print(f"  - {func['name']}: {func['description']}")
+                log.append(f"  - {func['name']}: {func['description']}")
         else:
-            print(f"Error getting functions: {response.status_code}")
+            log.append(f"Error getting functions: {response.status_code}")
             return False
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log.append(f"Error: {str(e)}")
         return False
-    
+        
     # Test weather function with different locations
     test_cases = [
         {"location": "São Paulo, Brazil", "units": "celsius"},
@@ -160,50 +234,60 @@ def test_execute_function(base_url):
         {"location": "Tokyo, Japan", "units": "celsius"}
     ]
     
-    print("\n2. Testing weather function execution...")
-    for i, test_case in enumerate(test_cases, 1):
-        print(f"\n  Test {i}: {test_case['location']} ({test_case['units']})")
+    async def execute(test_case):
+        """Execute one weather call, returning its response (or error) and duration"""
         payload = {
             "function_name": "get_weather",
             "arguments": test_case
         }
+        start_time = time.perf_counter()
+        try:
+            response = await client.post("/api/execute_function", json=payload)
+        except Exception as e:
+            response = e
+        return response, time.perf_counter() - start_time
+    
+    # The calls are independent, so send them concurrently and report them in order
+    log.append("\n2. Testing weather function execution...")
+    outcomes = await asyncio.gather(*(execute(test_case) for test_case in test_cases))
+    for i, (test_case, (response, elapsed)) in enumerate(zip(test_cases, outcomes), 1):
+        log.append(f"\n  Test {i}: {test_case['location']} ({test_case['units']})")
         
         try:
-            start_time = time.time()
-            response = requests.post(f"{base_url}/api/execute_function", json=payload)
-            elapsed = time.time() - start_time
+            if isinstance(response, Exception):
+                raise response
             
-            print(f"  Status Code: {response.status_code}")
-            print(f"  Time taken: {elapsed:.2f} seconds")
+            log.append(f"  Status Code: {response.status_code}")
+            log.append(f"  Time taken: {elapsed:.2f} seconds")
             
             if response.status_code == 200:
                 result = response.json()
                 if result['success']:
                     weather = result['result']
-                    print(f"  ✓ Success!")
-                    print(f"    Location: {weather.get('location', 'N/A')}")
-                    print(f"    Temperature: {weather.get('temperature', 'N/A')}{weather.get('unit', '')}")
-                    print(f"    Condition: {weather.get('condition', 'N/A')}")
-                    print(f"    Humidity: {weather.get('humidity', 'N/A')}%")
-                    print(f"    Wind Speed: {weather.get('wind_speed', 'N/A')} km/h")
+                    log.append(f"  ✓ Success!")
+                    log.append(f"    Location: {weather.get('location', 'N/A')}")
+                    log.append(f"    Temperature: {weather.get('temperature', 'N/A')}{weather.get('unit', '')}")
+                    log.append(f"    Condition: {weather.get('condition', 'N/A')}")
+                    log.append(f"    Humidity: {weather.get('humidity', 'N/A')}%")
+                    log.append(f"    Wind Speed: {weather.get('wind_speed', 'N/A')} km/h")
                     if 'description' in weather:
-                        print(f"    Description: {weather['description']}")
+                        log.append(f"    Description: {weather['description']}")
                 else:
-                    print(f"  ✗ Function execution failed: {result.get('error', 'Unknown error')}")
+                    log.append(f"  ✗ Function execution failed: {result.get('error', 'Unknown error')}")
                     return False
             else:
-                print(f"  ✗ Error: {response.text}")
+                log.append(f"  ✗ Error: {response.text}")
                 return False
                 
         except Exception as e:
-            print(f"  ✗ Error: {str(e)}")
+            log.append(f"  ✗ Error: {str(e)}")
             return False
-    
-    print("\n✓ All function execution tests passed!")
+            
+    log.append("\n✓ All function execution tests passed!")
     return True
 
-def test_stream(base_url):
-    """Test the streaming endpoint"""
+async def test_stream(client):
+    """Test the streaming endpoint (prints tokens live, so it runs on its own and is never retried)"""
     print("\n=== Testing Streaming Endpoint ===")
     payload = {
         "messages": [
@@ -216,74 +300,98 @@ def test_stream(base_url):
     
     try:
         print("Sending request to streaming endpoint...")
-        start_time = time.time()
+        start_time = time.perf_counter()
         
-        # Using a session for better connection handling
-        with requests.Session() as session:
-            with session.post(
-                f"{base_url}/v1/stream",
-                json=payload,
-                stream=True,
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                
-                print(f"Status Code: {response.status_code}")
+        async with client.stream("POST", "/v1/stream", json=payload) as response:
+            print(f"Status Code: {response.status_code}")
+            
+            if response.status_code == 200:
+                # Process the streaming response
+                print("Receiving stream:")
+                print("-" * 40)
                 
-                if response.status_code == 200:
-                    # Process the streaming response
-                    print("Receiving stream:")
-                    print("-" * 40)
-                    
-                    full_response = ""
-                    for chunk in response.iter_content(chunk_size=1024):
-                        if chunk:
-                            chunk_str = chunk.decode('utf-8')
-                            print(chunk_str, end='', flush=True)
-                            full_response += chunk_str
-                    
-                    print("\n" + "-" * 40)
-                    elapsed = time.time() - start_time
-                    print(f"Time taken: {elapsed:.2f} seconds")
-                    print(f"Total response length: {len(full_response)} bytes")
-                    return True
-                else:
-                    print(f"Error: {response.text}")
-                    return False
+                # Chunks can end mid-character, so decode incrementally
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                response_length = 0
+                async for chunk in response.aiter_bytes():
+                    if chunk:
+                        print(decoder.decode(chunk), end='', flush=True)
+                        response_length += len(chunk)
+                print(decoder.decode(b'', final=True), end='')
+                        
+                print("\n" + "-" * 40)
+                elapsed = time.perf_counter() - start_time
+                print(f"Time taken: {elapsed:.2f} seconds")
+                print(f"Total response length: {response_length} bytes")
+                return True
+            else:
+                await response.aread()
+                print(f"Error: {response.text}")
+                return False
                 
     except Exception as e:
         print(f"Error: {str(e)}")
         return False
 
+# Checks that only print once they finish, so they can run concurrently
+CONCURRENT_TESTS = {
+    "generate": test_generate,
+    "chat": test_chat_completion,
+    "function": test_function_call,
+    "execute": test_execute_function,
+}
+
+async def run_tests(base_url, test, mode="live", fixtures_path=DEFAULT_FIXTURES):
+    """Run the selected tests over one pooled HTTP client"""
+    fixtures = {}
+    if mode == "replay":
+        with open(fixtures_path, encoding="utf-8") as f:
+            fixtures = json.load(f)
+    
+    if mode == "record":
+        transport = RecordingTransport(fixtures)
+    elif mode == "replay":
+        transport = ReplayTransport(fixtures)
+    else:
+        transport = create_transport()
+    
+    async with httpx.AsyncClient(base_url=base_url, timeout=TIMEOUT, transport=transport) as client:
+        if test == "all" or test == "health":
+            log = []
+            health_ok = await test_health(client, log)
+            print("\n".join(log))
+            if not health_ok:
+                print("Health check failed. Make sure the API is running.")
+                if test == "health":
+                    return
+                    
+        # Independent checks run concurrently; each one's output is printed as a block, in order
+        selected = [name for name in CONCURRENT_TESTS if test in ("all", name)]
+        logs = [[] for _ in selected]
+        await asyncio.gather(*(CONCURRENT_TESTS[name](client, log) for name, log in zip(selected, logs)))
+        for log in logs:
+            print("\n".join(log))
+            
+        if test == "all" or test == "stream":
+            await test_stream(client)
+            
+    if mode == "record":
+        os.makedirs(os.path.dirname(fixtures_path) or ".", exist_ok=True)
+        with open(fixtures_path, "w", encoding="utf-8") as f:
+            json.dump(fixtures, f, indent=2)
+        print(f"\nRecorded {len(fixtures)} responses to {fixtures_path}")
+
 def main():
     parser = argparse.ArgumentParser(description="Test the Granite4Nano-1B API")
     parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the API")
     parser.add_argument("--test", choices=["all", "health", "generate", "chat", "function", "execute", "stream"], default="all",
                         help="Which test to run")
+    parser.add_argument("--mode", choices=["live", "record", "replay"], default="live",
+                        help="Call the API, call it and record the responses, or replay recorded responses")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="File recorded responses are saved to and replayed from")
     args = parser.parse_args()
     
-    base_url = args.url
-    
-    if args.test == "all" or args.test == "health":
-        health_ok = test_health(base_url)
-        if not health_ok:
-            print("Health check failed. Make sure the API is running.")
-            if args.test == "health":
-                return
-    
-    if args.test == "all" or args.test == "generate":
-        test_generate(base_url)
-    
-    if args.test == "all" or args.test == "chat":
-        test_chat_completion(base_url)
-    
-    if args.test == "all" or args.test == "function":
-        test_function_call(base_url)
-    
-    if args.test == "all" or args.test == "execute":
-        test_execute_function(base_url)
-        
-    if args.test == "all" or args.test == "stream":
-        test_stream(base_url)
+    asyncio.run(run_tests(args.url, args.test, args.mode, args.fixtures))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from services import search_service
+
+
+class SearchCoalescingTest(unittest.IsolatedAsyncioTestCase):
+    """Concurrent identical searches share one request"""
+
+    def setUp(self):
+        search_service._search_cache.clear()
+        search_service._search_inflight.clear()
+
+    async def test_cancelled_first_caller_does_not_cancel_waiters(self):
+        release = asyncio.Event()
+        calls = 0
+
+        async def fake_fetch(query, max_results):
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"query": query, "abstract": "answer"}
+
+        with mock.patch.object(search_service, "_fetch_search_results", fake_fetch):
+            first = asyncio.create_task(search_service.search_web("python"))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(search_service.search_web("python"))
+            await asyncio.sleep(0)
+
+            # The first caller disconnects while the search is still running
+            first.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+
+            release.set()
+            result = await second
+
+        self.assertEqual(result["abstract"], "answer")
+        self.assertEqual(calls, 1)
+        self.assertFalse(search_service._search_inflight)
+
+    async def test_failure_reaches_waiters(self):
+        release = asyncio.Event()
+
+        async def fake_fetch(query, max_results):
+            await release.wait()
+            raise RuntimeError("boom")
+
+        with mock.patch.object(search_service, "_fetch_search_results", fake_fetch):
+            first = asyncio.create_task(search_service.search_web("python"))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(search_service.search_web("python"))
+            await asyncio.sleep(0)
+            release.set()
+
+            for task in (first, second):
+                with self.assertRaises(RuntimeError):
+                    await task
+
+        self.assertFalse(search_service._search_cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# Made with Bob
@@ -1,38 +1,135 @@
 import diskcache
 import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Size of each read while hashing a document for its cache key
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Extended attribute holding "<key>:<mtime_ns>" for a file's last computed cache key
+KEY_XATTR = "user.cache_key"
+
+# Recently used documents kept in memory in front of the on-disk cache
+HOT_CACHE_MAX_ENTRIES = 64
+
 class CacheManager:
     """Manages caching of processed documents"""
     
     def __init__(self, cache_dir: str, ttl_hours: int = 24):
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.cache = diskcache.Cache(str(self.cache_dir))
+        # Expired entries are swept by the cleanup scheduler; culling on every
+        # set would put that scan on the upload path
+        self.cache = diskcache.Cache(str(self.cache_dir), cull_limit=0)
         self.ttl_seconds = ttl_hours * 3600
+        # File state (inode, size, mtime) -> content key, so a file that was
+        # already hashed is not read again on later lookups
+        self._stat_index: Dict[Tuple[int, int, int], str] = {}
+        # Key -> (expiry timestamp, document); read before the SQLite-backed cache
+        self._hot: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # The scheduler thread clears entries while requests read them
+        self._hot_lock = threading.Lock()
         logger.info(f"CacheManager initialized: {self.cache_dir}, TTL={ttl_hours}h")
     
     def _generate_key(self, file_path: str) -> str:
         """Generate cache key from file path and content hash"""
         try:
+            key = self._read_key_xattr(file_path)
+            if key is not None:
+                return key
+            
+            # BLAKE2b is faster than SHA-256 in software; hashing in chunks
+            # keeps large documents from being read into memory at once. The
+            # digest matches FileManager's upload hash, see add_known_hash
+            file_hash = hashlib.blake2b(digest_size=16)
             with open(file_path, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
-            return f"doc_{file_hash}"
+                while chunk := f.read(HASH_CHUNK_SIZE):
+                    file_hash.update(chunk)
+            key = self._key_for_hash(file_hash.hexdigest())
+            self._write_key_xattr(file_path, key)
+            return key
         except Exception as e:
             logger.error(f"Error generating cache key: {str(e)}")
             # Fallback to path-based key
             return f"doc_{hashlib.md5(file_path.encode()).hexdigest()}"
     
+    def _key_for_hash(self, content_hash: str) -> str:
+        """Build the cache key for a 128-bit BLAKE2b content hash"""
+        return f"doc_b2_{content_hash}"
+    
+    def add_known_hash(self, file_path: str, content_hash: str):
+        """
+        Record the content hash of a file that was hashed while it was written.
+        
+        FileManager hashes uploads with the same 128-bit BLAKE2b as the cache
+        keys, so passing that hash here lets lookups of the fresh upload skip
+        reading it again; only files that arrive without one are hashed here.
+        """
+        stat_key = self._stat_key(file_path)
+        if stat_key is not None:
+            self._stat_index[stat_key] = self._key_for_hash(content_hash)
+    
+    def _read_key_xattr(self, file_path: str) -> Optional[str]:
+        """Return the key stored on the file if it was computed for its current mtime"""
+        if not hasattr(os, "getxattr"):
+            return None
+        try:
+            key, mtime_ns = os.getxattr(file_path, KEY_XATTR).decode().rsplit(":", 1)
+            if int(mtime_ns) == os.stat(file_path).st_mtime_ns:
+                return key
+        except (OSError, ValueError):
+            pass
+        return None
+    
+    def _write_key_xattr(self, file_path: str, key: str):
+        """Store the key on the file so later processes can skip hashing it"""
+        if not hasattr(os, "setxattr"):
+            return
+        try:
+            mtime_ns = os.stat(file_path).st_mtime_ns
+            os.setxattr(file_path, KEY_XATTR, f"{key}:{mtime_ns}".encode())
+        except OSError:
+            # Filesystem without user extended attributes
+            pass
+    
+    def _stat_key(self, file_path: str) -> Optional[Tuple[int, int, int]]:
+        """Identify the current state of a file without reading it"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+    
+    def get_key(self, file_path: str) -> str:
+        """Get the content key for a file, hashing it only if its state is unseen"""
+        stat_key = self._stat_key(file_path)
+        key = self._stat_index.get(stat_key) if stat_key is not None else None
+        if key is None:
+            key = self._generate_key(file_path)
+            if stat_key is not None:
+                self._stat_index[stat_key] = key
+        return key
+    
     def get(self, file_path: str) -> Optional[Dict[str, Any]]:
         """Retrieve cached processed document"""
         try:
-            key = self._generate_key(file_path)
-            cached_data = self.cache.get(key)
+            key = self.get_key(file_path)
+            with self._hot_lock:
+                hot = self._hot.get(key)
+                if hot is not None and hot[0] > time.time():
+                    self._hot.move_to_end(key)
+                    return hot[1]
+            
+            cached_data, expire_time = self.cache.get(key, expire_time=True)
             if cached_data:
+                self._remember(key, cached_data, expire_time or time.time() + self.ttl_seconds)
                 logger.debug(f"Cache hit for {Path(file_path).name}")
             return cached_data
         except Exception as e:
@@ -42,17 +139,36 @@ class CacheManager:
     def set(self, file_path: str, processed_data: Dict[str, Any]):
         """Cache processed document"""
         try:
-            key = self._generate_key(file_path)
+            key = self.get_key(file_path)
             self.cache.set(key, processed_data, expire=self.ttl_seconds)
+            self._remember(key, processed_data, time.time() + self.ttl_seconds)
             logger.debug(f"Cached document: {Path(file_path).name}")
         except Exception as e:
             logger.error(f"Error setting cache: {str(e)}")
     
+    def _remember(self, key: str, processed_data: Dict[str, Any], expire_time: float):
+        """Keep a document in the in-memory tier, evicting the least recently used"""
+        with self._hot_lock:
+            self._hot[key] = (expire_time, processed_data)
+            self._hot.move_to_end(key)
+            while len(self._hot) > HOT_CACHE_MAX_ENTRIES:
+                self._hot.popitem(last=False)
+    
     def clear_expired(self):
         """Remove expired cache entries"""
         try:
             # diskcache handles expiration automatically, but we can trigger cleanup
             self.cache.expire()
+            # Culling is off on set, so enforce the size limit here as well
+            self.cache.cull()
+            # Forget file states whose content is no longer cached
+            self._stat_index = {
+                stat_key: key for stat_key, key in self._stat_index.items() if key in self.cache
+            }
+            now = time.time()
+            with self._hot_lock:
+                for key in [key for key, (expire_time, _) in self._hot.items() if expire_time <= now]:
+                    del self._hot[key]
             logger.info("Cache expiration check completed")
         except Exception as e:
             logger.error(f"Error clearing expired cache: {str(e)}")
@@ -61,6 +177,9 @@ class CacheManager:
         """Clear all cache entries"""
         try:
             self.cache.clear()
+            self._stat_index = {}
+            with self._hot_lock:
+                self._hot.clear()
             logger.info("Cache cleared")
         except Exception as e:
             logger.error(f"Error clearing cache: {str(e)}")
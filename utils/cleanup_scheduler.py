@@ -1,41 +1,37 @@
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Seconds between cleanup sweeps
+FILE_CLEANUP_INTERVAL = 3600
+CACHE_CLEANUP_INTERVAL = 6 * 3600
+
 class CleanupScheduler:
-    """Manages background cleanup tasks"""
+    """Manages background cleanup tasks as asyncio tasks on the event loop"""
     
     def __init__(self, file_manager, cache_manager):
-        self.scheduler = AsyncIOScheduler()
         self.file_manager = file_manager
         self.cache_manager = cache_manager
+        self.tasks = []
         logger.info("CleanupScheduler initialized")
     
     def start(self):
         """Start scheduled cleanup tasks"""
-        # Cleanup old files every hour
-        self.scheduler.add_job(
-            self._cleanup_files,
-            trigger=IntervalTrigger(hours=1),
-            id='cleanup_files',
-            name='Cleanup old uploaded files',
-            replace_existing=True
-        )
-        
-        # Cleanup expired cache every 6 hours
-        self.scheduler.add_job(
-            self._cleanup_cache,
-            trigger=IntervalTrigger(hours=6),
-            id='cleanup_cache',
-            name='Cleanup expired cache',
-            replace_existing=True
-        )
-        
-        self.scheduler.start()
+        self.tasks = [
+            # Cleanup old files every hour
+            asyncio.create_task(self._run_periodically(self._cleanup_files, FILE_CLEANUP_INTERVAL)),
+            # Cleanup expired cache every 6 hours
+            asyncio.create_task(self._run_periodically(self._cleanup_cache, CACHE_CLEANUP_INTERVAL)),
+        ]
         logger.info("Cleanup scheduler started")
     
+    async def _run_periodically(self, sweep, interval: float):
+        """Run a blocking sweep on a worker thread every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(sweep)
+    
     def _cleanup_files(self):
         """Cleanup old uploaded files"""
         try:
@@ -53,12 +49,12 @@ class CleanupScheduler:
         except Exception as e:
             logger.error(f"Error cleaning up cache: {str(e)}")
     
-    def shutdown(self):
-        """Shutdown scheduler"""
-        try:
-            self.scheduler.shutdown()
-            logger.info("Cleanup scheduler stopped")
-        except Exception as e:
-            logger.error(f"Error shutting down scheduler: {str(e)}")
+    async def shutdown(self):
+        """Cancel the cleanup tasks and wait for them to finish"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        logger.info("Cleanup scheduler stopped")
 
 # Made with Bob
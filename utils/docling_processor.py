@@ -1,31 +1,105 @@
 from docling.document_converter import DocumentConverter
 from pathlib import Path
 import asyncio
-from typing import Dict, Any, List
+import os
+import re
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Converter owned by a worker process, created on its first conversion
+_worker_converter: Optional[DocumentConverter] = None
+
+# First non-blank line of a document
+_FIRST_LINE = re.compile(r"^\s*(\S.*)$", re.MULTILINE)
+
+
+def _convert_in_worker(file_path: str) -> Dict[str, Any]:
+    """Convert a document inside a process pool worker"""
+    global _worker_converter
+    if _worker_converter is None:
+        _worker_converter = DocumentConverter()
+    return _convert_with(_worker_converter, file_path)
+
+
+def _convert_with(converter: DocumentConverter, file_path: str) -> Dict[str, Any]:
+    """Synchronous document conversion returning a plain (picklable) dict"""
+    try:
+        logger.info(f"Converting document: {file_path}")
+        result = converter.convert(file_path)
+        markdown_content = result.document.export_to_markdown()
+        
+        # Extract metadata
+        metadata = {
+            "filename": Path(file_path).name,
+            "page_count": getattr(result.document, 'page_count', None),
+            "title": _extract_title(markdown_content),
+            "content_length": len(markdown_content),
+            "format": Path(file_path).suffix[1:].upper()
+        }
+        
+        logger.info(f"Document converted successfully: {metadata['filename']} ({metadata['content_length']} chars)")
+        
+        return {
+            "markdown": markdown_content,
+            "metadata": metadata,
+            "success": True
+        }
+        
+    except Exception as e:
+        logger.error(f"Error converting document {file_path}: {str(e)}")
+        return {
+            "markdown": "",
+            "metadata": {"filename": Path(file_path).name},
+            "success": False,
+            "error": str(e)
+        }
+
+
+def _extract_title(markdown: str) -> str:
+    """Extract title from markdown (first heading or first line)"""
+    # Search for the first non-blank line instead of splitting the whole document
+    match = _FIRST_LINE.search(markdown) if markdown else None
+    if match is None:
+        return "Untitled Document"
+    
+    line = match.group(1).strip()
+    if line.startswith('#'):
+        return line.lstrip('#').strip()
+    return line[:100]  # First 100 chars
+
+
 class DoclingProcessor:
     """Handles document processing with Docling"""
     
-    def __init__(self):
-        self.converter = DocumentConverter()
-        logger.info("DoclingProcessor initialized")
+    def __init__(self, process_pool: Optional[Executor] = None):
+        # With a process pool each worker owns its converter; otherwise convert in-process
+        self.process_pool = process_pool
+        self.converter = DocumentConverter() if process_pool is None else None
+        logger.info(f"DoclingProcessor initialized ({'process pool' if process_pool else 'thread pool'})")
     
     async def process_document(self, file_path: str) -> Dict[str, Any]:
         """
         Process document and extract markdown content.
-        Runs in thread pool to avoid blocking.
+        Runs in a process pool (or thread pool) to avoid blocking.
         """
         try:
-            # Run Docling conversion in thread pool (it's CPU-intensive)
+            # Docling conversion is CPU-intensive; a process pool sidesteps the GIL
             loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None,
-                self._convert_document,
-                file_path
-            )
+            if self.process_pool is not None:
+                result = await loop.run_in_executor(
+                    self.process_pool,
+                    _convert_in_worker,
+                    file_path
+                )
+            else:
+                result = await loop.run_in_executor(
+                    None,
+                    self._convert_document,
+                    file_path
+                )
             
             return result
             
@@ -40,56 +114,32 @@ class DoclingProcessor:
     
     def _convert_document(self, file_path: str) -> Dict[str, Any]:
         """Synchronous document conversion"""
-        try:
-            logger.info(f"Converting document: {file_path}")
-            result = self.converter.convert(file_path)
-            markdown_content = result.document.export_to_markdown()
-            
-            # Extract metadata
-            metadata = {
-                "filename": Path(file_path).name,
-                "page_count": getattr(result.document, 'page_count', None),
-                "title": self._extract_title(markdown_content),
-                "content_length": len(markdown_content),
-                "format": Path(file_path).suffix[1:].upper()
-            }
-            
-            logger.info(f"Document converted successfully: {metadata['filename']} ({metadata['content_length']} chars)")
-            
-            return {
-                "markdown": markdown_content,
-                "metadata": metadata,
-                "success": True
-            }
-            
-        except Exception as e:
-            logger.error(f"Error in _convert_document: {str(e)}")
-            return {
-                "markdown": "",
-                "metadata": {"filename": Path(file_path).name},
-                "success": False,
-                "error": str(e)
-            }
-    
-    def _extract_title(self, markdown: str) -> str:
-        """Extract title from markdown (first heading or first line)"""
-        if not markdown:
-            return "Untitled Document"
-        
-        lines = markdown.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith('#'):
-                return line.lstrip('#').strip()
-            elif line:
-                return line[:100]  # First 100 chars
-        return "Untitled Document"
+        return _convert_with(self.converter, file_path)
     
     async def process_multiple_documents(self, file_paths: List[str]) -> List[Dict[str, Any]]:
-        """Process multiple documents in parallel"""
+        """
+        Process multiple documents in parallel.
+        
+        At most one conversion per CPU is in flight, so a large batch does
+        not hold every document in memory at once. Progress is logged as
+        conversions finish; results keep the order of file_paths.
+        """
         logger.info(f"Processing {len(file_paths)} documents in parallel")
-        tasks = [self.process_document(path) for path in file_paths]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        semaphore = asyncio.Semaphore(os.cpu_count() or 4)
+        
+        async def process(index: int, path: str):
+            async with semaphore:
+                try:
+                    return index, await self.process_document(path)
+                except Exception as e:
+                    return index, e
+        
+        results: List[Any] = [None] * len(file_paths)
+        tasks = [asyncio.ensure_future(process(i, path)) for i, path in enumerate(file_paths)]
+        for completed, finished in enumerate(asyncio.as_completed(tasks), 1):
+            index, result = await finished
+            results[index] = result
+            logger.debug(f"Processed {completed}/{len(file_paths)} documents")
         
         # Handle exceptions in results
         processed_results = []
@@ -1,20 +1,26 @@
 import os
+import re
 import hashlib
+import tempfile
+import time
 import aiofiles
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Optional, List, Tuple
+from datetime import datetime
+from typing import AsyncIterable, Iterable, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Characters stripped from stored filenames (anything but word characters, spaces, dots and hyphens)
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^\w\s\-\.]')
+
 class FileManager:
     """Manages file storage, validation, and cleanup"""
     
-    def __init__(self, upload_dir: str, max_size_mb: int, allowed_extensions: List[str]):
+    def __init__(self, upload_dir: str, max_size_mb: int, allowed_extensions: Iterable[str]):
         self.upload_dir = Path(upload_dir)
         self.max_size_bytes = max_size_mb * 1024 * 1024
-        self.allowed_extensions = set(ext.lower() for ext in allowed_extensions)
+        self.allowed_extensions = frozenset(ext.lower() for ext in allowed_extensions)
         self.upload_dir.mkdir(parents=True, exist_ok=True)
         logger.info(f"FileManager initialized: {self.upload_dir}, max_size={max_size_mb}MB")
     
@@ -31,32 +37,57 @@ class FileManager:
         
         return True, None
     
-    async def save_file(self, file_content: bytes, filename: str) -> str:
-        """Save file with unique name and return file path"""
-        # Generate unique filename using hash + timestamp
-        file_hash = hashlib.md5(file_content).hexdigest()[:8]
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        ext = filename.rsplit('.', 1)[-1] if '.' in filename else 'bin'
+    async def save_file(self, chunks: AsyncIterable[bytes], filename: str) -> Optional[Tuple[str, str]]:
+        """
+        Write an asynchronous byte stream (e.g. Request.stream()) to a file with a unique name.
+        
+        Chunks are hashed and written as they arrive, so only one chunk is held
+        in memory, and the copy stops as soon as the size limit is crossed.
         
-        # Sanitize original filename
-        safe_filename = self._sanitize_filename(filename)
-        unique_filename = f"{timestamp}_{file_hash}_{safe_filename}"
+        Returns:
+            Tuple of (file path, content hash), or None if the file is too large
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        size = 0
+        staging_fd, staging_path = tempfile.mkstemp(dir=self.upload_dir, prefix=".upload_")
+        os.close(staging_fd)
+        try:
+            async with aiofiles.open(staging_path, 'wb') as staging:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_size_bytes:
+                        break
+                    digest.update(chunk)
+                    await staging.write(chunk)
+        except BaseException:
+            os.unlink(staging_path)
+            raise
         
-        file_path = self.upload_dir / unique_filename
+        if size > self.max_size_bytes:
+            os.unlink(staging_path)
+            return None
         
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(file_content)
+        return self._commit_staged(staging_path, digest.hexdigest(), filename, size)
+    
+    def _commit_staged(self, staging_path: str, file_hash: str, filename: str, size: int) -> Tuple[str, str]:
+        """Move a fully written staging file to its unique name"""
+        file_path = self.upload_dir / self._unique_filename(file_hash, filename)
+        os.replace(staging_path, file_path)
         
-        logger.info(f"File saved: {unique_filename} ({len(file_content)} bytes)")
-        return str(file_path)
+        logger.info(f"File saved: {file_path.name} ({size} bytes)")
+        return str(file_path), file_hash
+    
+    def _unique_filename(self, file_hash: str, filename: str) -> str:
+        """Build a unique stored filename from the content hash, a timestamp and the sanitized name"""
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        return f"{timestamp}_{file_hash[:8]}_{self._sanitize_filename(filename)}"
     
     def _sanitize_filename(self, filename: str) -> str:
         """Sanitize filename to prevent path traversal"""
-        import re
         # Remove path components
         filename = Path(filename).name
         # Remove dangerous characters, keep alphanumeric, spaces, dots, hyphens, underscores
-        filename = re.sub(r'[^\w\s\-\.]', '', filename)
+        filename = _UNSAFE_FILENAME_CHARS.sub('', filename)
         # Limit length
         if len(filename) > 200:
             name, ext = filename.rsplit('.', 1) if '.' in filename else (filename, '')
@@ -64,18 +95,23 @@ class FileManager:
         return filename
     
     def cleanup_old_files(self, max_age_hours: int = 1) -> int:
-        """Remove files older than specified hours"""
-        cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
+        """
+        Remove files older than specified hours.
+        
+        Blocking; the cleanup scheduler runs it in a worker thread. scandir
+        returns each entry's type with the listing, so only regular files
+        are stat'ed, and ages are compared as plain timestamps.
+        """
+        cutoff_ts = time.time() - max_age_hours * 3600
         deleted_count = 0
         
         try:
-            for file_path in self.upload_dir.glob('*'):
-                if file_path.is_file():
-                    file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-                    if file_time < cutoff_time:
-                        file_path.unlink()
+            with os.scandir(self.upload_dir) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff_ts:
+                        os.unlink(entry.path)
                         deleted_count += 1
-                        logger.debug(f"Deleted old file: {file_path.name}")
+                        logger.debug(f"Deleted old file: {entry.name}")
         except Exception as e:
             logger.error(f"Error during cleanup: {str(e)}")
         